@@ -0,0 +1,29 @@
+"""
+Assertion Cache
+On-disk cache for AI-generated assertion responses, keyed by content hash
+"""
+import hashlib
+from pathlib import Path
+from typing import Optional
+
+CACHE_DIR = Path(__file__).parent.parent / ".assertion_cache"
+
+
+def make_key(original_code: str, prompt_version: str, model_id: str) -> str:
+    """Build a cache key from the test source, prompt version and model"""
+    return hashlib.sha256((original_code + prompt_version + model_id).encode()).hexdigest()
+
+
+def get(key: str) -> Optional[str]:
+    """Return the cached response for key, or None on a miss"""
+    cache_file = CACHE_DIR / f"{key}.py"
+    try:
+        return cache_file.read_text()
+    except FileNotFoundError:
+        return None
+
+
+def put(key: str, value: str):
+    """Store a response under key"""
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    (CACHE_DIR / f"{key}.py").write_text(value)
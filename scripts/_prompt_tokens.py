@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Prompt Token Budget Check
+Estimates token counts for the assertion prompt and fails when it grows past its budget
+(add_assertions.py runs the static preamble check on every run)
+
+Usage:
+    python scripts/_prompt_tokens.py [test_file]
+"""
+import sys
+from pathlib import Path
+
+# Token budget for the static assertion prompt preamble
+STATIC_PROMPT_TOKEN_CEILING = 200
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def check_prompt_budget(text: str, ceiling: int) -> int:
+    """
+    Check a prompt against a token ceiling
+
+    Args:
+        text: Rendered prompt text
+        ceiling: Maximum allowed estimated tokens
+
+    Returns:
+        Estimated token count
+
+    Raises:
+        ValueError: If the estimate exceeds the ceiling
+    """
+    tokens = estimate_tokens(text)
+    if tokens > ceiling:
+        raise ValueError(f"Prompt is ~{tokens} tokens, over the {ceiling} token budget")
+    return tokens
+
+
+def main():
+    import add_assertions
+
+    static_tokens = check_prompt_budget(
+        add_assertions._STATIC_PREAMBLE, STATIC_PROMPT_TOKEN_CEILING
+    )
+    print(f"Static preamble: ~{static_tokens} tokens (budget {STATIC_PROMPT_TOKEN_CEILING})")
+
+    if len(sys.argv) > 1:
+        test_code = Path(sys.argv[1]).read_text()
+        analysis = add_assertions.analyze_test_code(test_code)
+        dynamic = add_assertions.generate_assertions_prompt(test_code, analysis)
+        print(f"Per-test prompt: ~{estimate_tokens(dynamic)} tokens")
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
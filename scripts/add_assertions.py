@@ -3,52 +3,66 @@
 Add Assertions to Codegen Tests
 Takes a codegen-recorded test and enhances it with AI-generated assertions
 """
+import argparse
 import sys
-import os
 import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Optional
+
+# Sibling modules in scripts/ (the script's own directory is on sys.path)
+import _assertion_cache as assertion_cache
+from _prompt_tokens import STATIC_PROMPT_TOKEN_CEILING, check_prompt_budget
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.ai.test_generator import AITestGenerator
+if TYPE_CHECKING:
+    from src.ai.test_generator import AITestGenerator
+
+
+# One alternative per action type, tried in priority order at the start of each
+# line; the lookaheads keep the match on a single line
+_ACTION_RE = re.compile(
+    r'^(?:(?P<navigation>(?=.*page\.goto\())'
+    r'|(?P<link_click>(?=.*\.click\(\))(?=.*get_by_role\("link"))'
+    r'|(?P<form_fill>(?=.*\.fill\())'
+    r'|(?P<button_click>(?=.*get_by_role\("button")(?=.*\.click\(\))))'
+    r'.*$',
+    re.MULTILINE,
+)
+
+_ACTION_SUGGESTIONS = {
+    'navigation': 'Add URL assertion after navigation',
+    'link_click': 'Add page load assertion after navigation',
+    'form_fill': 'Add input value assertion',
+    'button_click': 'Add state change assertion',
+}
+
+
+# Every action type needs one of these substrings somewhere in the file
+_ACTION_MARKERS = ('page.goto(', '.click()', '.fill(')
 
 
 def analyze_test_code(test_code: str) -> dict:
     """Analyze test code to identify assertion points"""
-    lines = test_code.split('\n')
-
     actions = []
-    for i, line in enumerate(lines):
+    if not any(marker in test_code for marker in _ACTION_MARKERS):
+        return {'total_actions': 0, 'actions': actions}
+
+    line = 0
+    pos = 0
+    for match in _ACTION_RE.finditer(test_code):
         # Look for key actions where assertions should be added
-        if 'page.goto(' in line:
-            actions.append({
-                'type': 'navigation',
-                'line': i,
-                'code': line.strip(),
-                'suggestion': 'Add URL assertion after navigation'
-            })
-        elif '.click()' in line and 'get_by_role("link"' in line:
-            actions.append({
-                'type': 'link_click',
-                'line': i,
-                'code': line.strip(),
-                'suggestion': 'Add page load assertion after navigation'
-            })
-        elif '.fill(' in line:
-            actions.append({
-                'type': 'form_fill',
-                'line': i,
-                'code': line.strip(),
-                'suggestion': 'Add input value assertion'
-            })
-        elif 'get_by_role("button"' in line and '.click()' in line:
-            actions.append({
-                'type': 'button_click',
-                'line': i,
-                'code': line.strip(),
-                'suggestion': 'Add state change assertion'
-            })
+        line += test_code.count('\n', pos, match.start())
+        pos = match.start()
+        actions.append({
+            'type': match.lastgroup,
+            'line': line,
+            'code': match.group().strip(),
+            'suggestion': _ACTION_SUGGESTIONS[match.lastgroup]
+        })
 
     return {
         'total_actions': len(actions),
@@ -56,110 +70,248 @@ def analyze_test_code(test_code: str) -> dict:
     }
 
 
+# Bump whenever the prompt below changes so cached responses are invalidated
+PROMPT_VERSION = "v4"
+
+# Static part of the prompt, sent first (and marked for provider-side prompt
+# caching once it reaches the minimum cacheable length). Must stay a plain string
+# (no interpolation) so it is byte-identical across calls.
+_STATIC_PREAMBLE = """
+Add assertions to this codegen-recorded Playwright test. It has actions (clicks, fills,
+navigation) but no assertions.
+
+Add Playwright expect() assertions:
+- After page.goto(): the URL loaded
+- After link clicks: navigation occurred
+- After form fills: the input holds the value
+- After button clicks: the expected state change
+- Visibility of key elements, plus page title/heading checks
+
+Rules:
+- Keep all original actions unchanged
+- Make assertions meaningful, not just "element exists"
+- Comment what each assertion verifies
+- Include all imports (re, expect)
+
+Output only the complete enhanced Python test code.
+"""
+
+
 def generate_assertions_prompt(test_code: str, analysis: dict) -> str:
-    """Generate prompt for AI to add assertions"""
-    return f"""
-You are enhancing a Playwright test that was recorded using codegen.
-The test currently only has ACTIONS (clicks, fills, navigation) but NO ASSERTIONS.
+    """Generate the per-test part of the prompt (sent after _STATIC_PREAMBLE)"""
+    counts = {action_type: 0 for action_type in _ACTION_SUGGESTIONS}
+    for action in analysis['actions']:
+        counts[action['type']] += 1
 
-Your task: Add comprehensive assertions to verify the test is working correctly.
+    actions = (
+        f"{analysis['total_actions']} total, {counts['navigation']} navigation, "
+        f"{counts['link_click']} link clicks, {counts['form_fill']} form fills, "
+        f"{counts['button_click']} button clicks"
+    )
 
-Original Test Code:
+    return f"""
+Test:
 ```python
 {test_code}
 ```
 
-Action Analysis:
-- Total Actions: {analysis['total_actions']}
-- Navigation Actions: {len([a for a in analysis['actions'] if a['type'] == 'navigation'])}
-- Link Clicks: {len([a for a in analysis['actions'] if a['type'] == 'link_click'])}
-- Form Fills: {len([a for a in analysis['actions'] if a['type'] == 'form_fill'])}
-- Button Clicks: {len([a for a in analysis['actions'] if a['type'] == 'button_click'])}
-
-Add Assertions For:
-1. After page.goto() - verify URL loaded correctly
-2. After link clicks - verify navigation occurred
-3. After form fills - verify input accepted value
-4. After button clicks - verify expected state change
-5. Add visibility checks for key elements
-6. Add page title/heading assertions
-
-Requirements:
-- Keep all original actions unchanged
-- Add expect() assertions after key actions
-- Use Playwright's expect() API
-- Make assertions meaningful (not just "element exists")
-- Add comments explaining what each assertion verifies
-- Ensure all imports are included (re, expect)
-
-Return ONLY the complete enhanced Python test code with assertions added.
+Actions: {actions}
 """
 
 
-def main():
-    if len(sys.argv) != 2:
-        print("Usage: python scripts/add_assertions.py <test_file>")
-        print("")
-        print("Example:")
-        print("  python scripts/add_assertions.py tests/recorded/test_gnav.py")
-        sys.exit(1)
+@lru_cache(maxsize=4)
+def _get_generator(use_claude: bool = True, cache: bool = True) -> "AITestGenerator":
+    """Return a shared AITestGenerator (and its HTTP client) per provider and cache choice"""
+    # Imported here so --help and usage errors don't pay for loading the AI SDKs
+    from src.ai.test_generator import AITestGenerator
 
-    test_file = sys.argv[1]
+    return AITestGenerator(use_claude=use_claude, cache=cache)
 
-    if not os.path.exists(test_file):
-        print(f"❌ Error: File not found: {test_file}")
+
+def _output_path(test_file: str) -> str:
+    """Path the enhanced version of test_file is written to"""
+    path = Path(test_file)
+    return str(path.with_name(path.stem + '_with_assertions.py'))
+
+
+def _stream_response(generator: "AITestGenerator", prompt: str) -> str:
+    """
+    Generate one enhanced test, printing a dot per streamed chunk as progress
+
+    Returns:
+        Raw response (cached responses are returned at once, without streaming)
+    """
+
+    def show_progress(chunk: str):
+        print(".", end="", flush=True)
+
+    try:
+        # Through _call_ai, so cached responses are reused
+        return generator._call_ai(
+            prompt, cached_prefix=_STATIC_PREAMBLE, stream_callback=show_progress
+        )
+    finally:
+        print()
+
+
+def _write_enhanced(test_file: str, original_code: str, enhanced_code: str):
+    """Save the enhanced test next to the original and print a summary"""
+    output_file = _output_path(test_file)
+    Path(output_file).write_text(enhanced_code, encoding='utf-8')
+
+    orig_lines = original_code.count('\n') + 1
+    new_lines = enhanced_code.count('\n') + 1
+
+    print(f"\n✅ Success!")
+    print(f"📝 Enhanced test saved to: {output_file}")
+    print("\n" + "=" * 70)
+    print("COMPARISON")
+    print("=" * 70)
+    print(f"Original:  {orig_lines} lines")
+    print(f"Enhanced:  {new_lines} lines")
+    print(f"Added:     {new_lines - orig_lines} lines of assertions")
+    print("\n" + "=" * 70)
+    print("NEXT STEPS")
+    print("=" * 70)
+    print(f"\n1. Review the enhanced test:")
+    print(f"   cat {output_file}")
+    print(f"\n2. Run the enhanced test:")
+    print(f"   pytest {output_file} --headed --slowmo 500")
+    print(f"\n3. If satisfied, replace original:")
+    print(f"   mv {output_file} {test_file}")
+    print("")
+
+
+def _result_or_none(test_file: str, call: Callable[[], str]) -> Optional[str]:
+    """Response returned by call, or None (after printing why) if it raised"""
+    try:
+        return call()
+    except Exception as e:
+        print(f"⚠️  {test_file}: {e}")
+        return None
+
+
+def _generate(generator: "AITestGenerator", prompts: Dict[str, str], mode: str) -> Dict[str, str]:
+    """
+    Generate enhanced code for each prompt
+
+    Args:
+        generator: AI test generator
+        prompts: Dict of test_file -> prompt
+        mode: "batch", "concurrent" or "sequential"
+
+    Returns:
+        Dict of test_file -> cleaned enhanced code (files whose call failed are left out)
+    """
+    files = list(prompts)
+    call_ai = partial(generator._call_ai, cached_prefix=_STATIC_PREAMBLE)
+
+    if mode == "batch":
+        batch_id = generator.submit_batch(
+            [prompts[f] for f in files], cached_prefix=_STATIC_PREAMBLE
+        )
+        print(f"   Submitted batch {batch_id} (results may take a while)")
+        responses = generator.get_batch_results(batch_id)
+    elif mode == "concurrent" and len(files) > 1:
+        # API calls are network bound, so threads overlap the wait
+        with ThreadPoolExecutor(max_workers=min(8, len(files))) as executor:
+            futures = [executor.submit(call_ai, prompts[f]) for f in files]
+        # A failed call only loses its own file; the others are still written and cached
+        responses = [_result_or_none(f, future.result) for f, future in zip(files, futures)]
+    else:
+        responses = [
+            _result_or_none(f, partial(_stream_response, generator, prompts[f])) for f in files
+        ]
+
+    results = {}
+    for test_file, response in zip(files, responses):
+        if response is None:
+            print(f"❌ No response for: {test_file}")
+            continue
+        results[test_file] = generator._clean_generated_code(response)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add AI-generated assertions to codegen-recorded tests",
+        epilog="Example: python scripts/add_assertions.py tests/recorded/test_gnav.py",
+    )
+    parser.add_argument("test_files", nargs="+", help="Recorded test file(s) to enhance")
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Ignore cached assertions and AI responses"
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--batch", dest="mode", action="store_const", const="batch",
+        help="Submit all files through the Anthropic Message Batches API",
+    )
+    mode.add_argument(
+        "--concurrent", dest="mode", action="store_const", const="concurrent",
+        help="Call the AI for all files concurrently (default)",
+    )
+    mode.add_argument(
+        "--sequential", dest="mode", action="store_const", const="sequential",
+        help="Call the AI for one file at a time",
+    )
+    parser.set_defaults(mode="concurrent")
+    args = parser.parse_args()
+
+    # Fail fast if the static prompt has grown past its token budget
+    try:
+        check_prompt_budget(_STATIC_PREAMBLE, STATIC_PROMPT_TOKEN_CEILING)
+    except ValueError as e:
+        print(f"❌ Error: static assertion prompt: {e}")
         sys.exit(1)
 
+    originals = {}
+    for test_file in args.test_files:
+        try:
+            originals[test_file] = Path(test_file).read_text(encoding='utf-8')
+        except FileNotFoundError:
+            print(f"❌ Error: File not found: {test_file}")
+            sys.exit(1)
+
     print("=" * 70)
     print("🤖 AI ASSERTION GENERATOR")
     print("=" * 70)
-    print(f"\n📁 Reading: {test_file}")
 
-    # Read original test
-    with open(test_file, 'r') as f:
-        original_code = f.read()
+    # --no-cache skips the AI response cache as well as the assertion cache
+    generator = _get_generator(use_claude=True, cache=not args.no_cache)  # Use Claude
+
+    cache_keys = {}
+    enhanced = {}
+    prompts = {}
 
-    # Analyze test
-    print("\n🔍 Analyzing test code...")
-    analysis = analyze_test_code(original_code)
-    print(f"   Found {analysis['total_actions']} actions that need assertions")
+    for test_file in args.test_files:
+        print(f"\n📁 Reading: {test_file}")
+        original_code = originals[test_file]
 
-    # Generate enhanced test with AI
-    print("\n🤖 Generating assertions with AI...")
-    print("   (This may take 30-60 seconds)")
+        cache_key = assertion_cache.make_key(original_code, PROMPT_VERSION, generator.model)
+        cache_keys[test_file] = cache_key
 
-    generator = AITestGenerator(use_claude=True)  # Use Claude
-    prompt = generate_assertions_prompt(original_code, analysis)
+        cached = None if args.no_cache else assertion_cache.get(cache_key)
+        if cached is not None:
+            print("⚡ Using cached assertions (pass --no-cache to regenerate)")
+            enhanced[test_file] = cached
+            continue
+
+        # Analyze test
+        print("🔍 Analyzing test code...")
+        analysis = analyze_test_code(original_code)
+        print(f"   Found {analysis['total_actions']} actions that need assertions")
+        prompts[test_file] = generate_assertions_prompt(original_code, analysis)
 
     try:
-        enhanced_code = generator._call_ai(prompt)
-
-        # Clean up the response
-        enhanced_code = generator._clean_generated_code(enhanced_code)
-
-        # Save enhanced version
-        output_file = test_file.replace('.py', '_with_assertions.py')
-        with open(output_file, 'w') as f:
-            f.write(enhanced_code)
-
-        print(f"\n✅ Success!")
-        print(f"📝 Enhanced test saved to: {output_file}")
-        print("\n" + "=" * 70)
-        print("COMPARISON")
-        print("=" * 70)
-        print(f"Original:  {len(original_code.split(chr(10)))} lines")
-        print(f"Enhanced:  {len(enhanced_code.split(chr(10)))} lines")
-        print(f"Added:     {len(enhanced_code.split(chr(10))) - len(original_code.split(chr(10)))} lines of assertions")
-        print("\n" + "=" * 70)
-        print("NEXT STEPS")
-        print("=" * 70)
-        print(f"\n1. Review the enhanced test:")
-        print(f"   cat {output_file}")
-        print(f"\n2. Run the enhanced test:")
-        print(f"   pytest {output_file} --headed --slowmo 500")
-        print(f"\n3. If satisfied, replace original:")
-        print(f"   mv {output_file} {test_file}")
-        print("")
+        if prompts:
+            # Generate enhanced tests with AI
+            print(f"\n🤖 Generating assertions with AI for {len(prompts)} file(s)...")
+            print("   (This may take 30-60 seconds)")
+
+            generated = _generate(generator, prompts, args.mode)
+            for test_file, enhanced_code in generated.items():
+                assertion_cache.put(cache_keys[test_file], enhanced_code)
+            enhanced.update(generated)
 
     except Exception as e:
         print(f"\n❌ Error generating assertions: {e}")
@@ -169,6 +321,13 @@ def main():
         print("3. Ensure test file has valid Python syntax")
         sys.exit(1)
 
+    for test_file in args.test_files:
+        if test_file in enhanced:
+            _write_enhanced(test_file, originals[test_file], enhanced[test_file])
+
+    if len(enhanced) != len(args.test_files):
+        sys.exit(1)
+
 
 if __name__ == "__main__":
     main()
@@ -5,12 +5,148 @@ Selector Discovery Script - Extract Real Selectors from Toyota.com
 This script uses Playwright to browse the live site and discover
 accurate selectors for test generation.
 """
+import asyncio
 import json
-from playwright.sync_api import sync_playwright
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Tuple
 
+# Candidate selectors by element category, checked in order against the
+# underscore-separated parts of the element name
+_SELECTOR_CANDIDATES: Dict[str, Tuple[str, ...]] = {
+    "logo": (
+        "img[alt*='Toyota' i]",
+        "img[alt*='logo' i]",
+        ".header img",
+        "header img",
+        "[class*='logo'] img",
+    ),
+    "menu": (
+        "button[aria-label*='menu' i]",
+        "[aria-label*='navigation' i]",
+        ".menu-button",
+        ".hamburger",
+        "button.nav-toggle",
+    ),
+    "search": (
+        "button[aria-label*='search' i]",
+        "input[type='search']",
+        "[class*='search']",
+        "#search",
+    ),
+    "vehicles": (
+        "a[href*='vehicles']",
+        "nav >> text=/vehicles/i",
+        "[data-analytics*='vehicles']",
+    ),
+    "zip": (
+        "input[name='zip']",
+        "input[name='zipCode']",
+        "input[id*='zip' i]",
+        "input[placeholder*='zip' i]",
+        "input[type='text'][maxlength='5']",
+    ),
+}
 
-def discover_page_elements(page, url: str, element_descriptions: Dict[str, str]) -> Dict[str, Any]:
+# Returns the index of the first selector matching a visible element, or -1
+_FIRST_VISIBLE_JS = """(selectors) => {
+    for (let i = 0; i < selectors.length; i++) {
+        let el;
+        try {
+            el = document.querySelector(selectors[i]);
+        } catch (e) {
+            continue;  // Not valid CSS
+        }
+        if (el) {
+            const rect = el.getBoundingClientRect();
+            if (rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden') {
+                return i;
+            }
+        }
+    }
+    return -1;
+}"""
+
+
+def _is_playwright_selector(selector: str) -> bool:
+    """Whether a selector uses Playwright-only syntax that querySelector can't parse"""
+    return ">>" in selector or selector.startswith(("text=", "xpath=", "//"))
+
+
+# Max concurrent element probes per page
+_MAX_CONCURRENT_PROBES = 4
+
+
+async def _discover_element(
+    page, element_name: str, description: str, semaphore: asyncio.Semaphore
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Discover selectors for a single element
+
+    Returns:
+        Tuple of (element result, log lines to print)
+    """
+    from playwright.async_api import Error as PlaywrightError
+
+    log = [f"   Looking for: {element_name} ({description})"]
+
+    # Try multiple selector strategies
+    selectors = []
+
+    # Strategy 1: Try common patterns. Match whole name_parts ("menu_button" ->
+    # {"menu", "button"}) rather than substrings, so categories can't collide
+    name_parts = set(element_name.lower().split("_"))
+    candidates = next(
+        (cands for category, cands in _SELECTOR_CANDIDATES.items() if category in name_parts),
+        (description,),
+    )
+
+    async def probe(selector: str) -> bool:
+        async with semaphore:
+            try:
+                return await page.locator(selector).first.is_visible()
+            except PlaywrightError:
+                return False
+
+    # Test all plain CSS candidates in one round-trip, then any
+    # Playwright-specific ones (text=, >>) through locators
+    css_candidates = [c for c in candidates if not _is_playwright_selector(c)]
+    index = -1
+    if css_candidates:
+        async with semaphore:
+            index = await page.evaluate(_FIRST_VISIBLE_JS, css_candidates)
+    if index >= 0:
+        selectors.append(css_candidates[index])
+        log.append(f"      ✅ Found: {css_candidates[index]}")
+    else:
+        pw_candidates = [c for c in candidates if _is_playwright_selector(c)]
+        visible = await asyncio.gather(*(probe(c) for c in pw_candidates))
+        hit = next((c for c, ok in zip(pw_candidates, visible) if ok), None)
+        if hit:
+            selectors.append(hit)
+            log.append(f"      ✅ Found: {hit}")
+
+    if not selectors:
+        # Try AI-like text search as fallback
+        try:
+            async with semaphore:
+                count = await page.get_by_text(description, exact=False).first.count()
+            if count > 0:
+                selector = f"text=/{description}/i"
+                selectors.append(selector)
+                log.append(f"      ✅ Found (text): {selector}")
+        except PlaywrightError:
+            log.append(f"      ❌ Not found")
+
+    result = {
+        "description": description,
+        "selectors": selectors,
+        "found": len(selectors) > 0
+    }
+    return result, log
+
+
+async def discover_page_elements(
+    page, url: str, element_descriptions: Dict[str, str]
+) -> Dict[str, Any]:
     """
     Navigate to a page and discover selectors for specified elements
 
@@ -22,136 +158,118 @@ def discover_page_elements(page, url: str, element_descriptions: Dict[str, str])
     Returns:
         Dict containing discovered selectors
     """
+    from playwright.async_api import Error as PlaywrightError
+
     print(f"\n🔍 Discovering selectors for: {url}")
-    page.goto(url, wait_until="networkidle")
-    page.wait_for_timeout(2000)  # Wait for dynamic content
+    await page.goto(url, wait_until="networkidle")
+    try:
+        # Wait for dynamic content to settle instead of sleeping a fixed time
+        await page.wait_for_function(
+            "() => document.readyState === 'complete' && !document.querySelector('[data-loading]')",
+            timeout=3000,
+        )
+    except PlaywrightError:
+        pass
+
+    # Probe all elements concurrently, bounded per page
+    semaphore = asyncio.Semaphore(_MAX_CONCURRENT_PROBES)
+    results = await asyncio.gather(
+        *(
+            _discover_element(page, element_name, description, semaphore)
+            for element_name, description in element_descriptions.items()
+        )
+    )
 
     discovered = {
         "url": url,
         "elements": {}
     }
 
-    for element_name, description in element_descriptions.items():
-        print(f"   Looking for: {element_name} ({description})")
-
-        # Try multiple selector strategies
-        selectors = []
-
-        # Strategy 1: Try common patterns
-        if "logo" in element_name.lower():
-            candidates = [
-                "img[alt*='Toyota' i]",
-                "img[alt*='logo' i]",
-                ".header img",
-                "header img",
-                "[class*='logo'] img"
-            ]
-        elif "menu" in element_name.lower():
-            candidates = [
-                "button[aria-label*='menu' i]",
-                "[aria-label*='navigation' i]",
-                ".menu-button",
-                ".hamburger",
-                "button.nav-toggle"
-            ]
-        elif "search" in element_name.lower():
-            candidates = [
-                "button[aria-label*='search' i]",
-                "input[type='search']",
-                "[class*='search']",
-                "#search"
-            ]
-        elif "vehicles" in element_name.lower():
-            candidates = [
-                "a[href*='vehicles']",
-                "nav >> text=/vehicles/i",
-                "[data-analytics*='vehicles']"
-            ]
-        elif "zip" in element_name.lower():
-            candidates = [
-                "input[name='zip']",
-                "input[name='zipCode']",
-                "input[id*='zip' i]",
-                "input[placeholder*='zip' i]",
-                "input[type='text'][maxlength='5']"
-            ]
-        else:
-            candidates = [description]
-
-        # Test each candidate selector
-        for selector in candidates:
-            try:
-                element = page.locator(selector).first
-                if element.count() > 0 and element.is_visible():
-                    selectors.append(selector)
-                    print(f"      ✅ Found: {selector}")
-                    break
-            except:
-                continue
-
-        if not selectors:
-            # Try AI-like text search as fallback
-            try:
-                text_locator = page.get_by_text(description, exact=False).first
-                if text_locator.count() > 0:
-                    selector = f"text=/{description}/i"
-                    selectors.append(selector)
-                    print(f"      ✅ Found (text): {selector}")
-            except:
-                print(f"      ❌ Not found")
-
-        discovered["elements"][element_name] = {
-            "description": description,
-            "selectors": selectors,
-            "found": len(selectors) > 0
-        }
+    for element_name, (result, log) in zip(element_descriptions, results):
+        print("\n".join(log))
+        discovered["elements"][element_name] = result
 
     return discovered
 
 
+# Resource types that don't affect selector discovery but dominate the networkidle wait
+_BLOCKED_RESOURCE_TYPES = frozenset({"media", "font"})
+
+
+async def _block_heavy_resources(route):
+    """Abort requests for video/audio and fonts, continue everything else"""
+    if route.request.resource_type in _BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def discover_all(pages_to_discover: Dict[str, Tuple[str, Dict[str, str]]]) -> Dict[str, Any]:
+    """
+    Discover selectors for several pages concurrently
+
+    Args:
+        pages_to_discover: Dict of page_name -> (url, element_descriptions)
+
+    Returns:
+        Dict of page_name -> discovered selectors
+    """
+    # Imported lazily to keep script start-up fast
+    from playwright.async_api import async_playwright
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+
+        # One shared context (cookies, consent state, connections) with a page
+        # per URL so the network waits overlap
+        context = await browser.new_context()
+        await context.route("**/*", _block_heavy_resources)
+        pages = [await context.new_page() for _ in pages_to_discover]
+
+        results = await asyncio.gather(
+            *(
+                discover_page_elements(page, url, elements)
+                for page, (url, elements) in zip(pages, pages_to_discover.values())
+            )
+        )
+
+        await browser.close()
+
+    return dict(zip(pages_to_discover, results))
+
+
 def main():
     print("="*70)
     print("🤖 SELECTOR DISCOVERY SCRIPT")
     print("="*70)
 
-    all_discoveries = {}
-
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-
-        # Homepage elements
-        homepage_elements = {
-            "logo": "Toyota logo",
-            "menu_button": "Menu button",
-            "search_button": "Search button",
-            "vehicles_link": "Vehicles navigation link"
-        }
-        all_discoveries["homepage"] = discover_page_elements(
-            page, "https://www.toyota.com", homepage_elements
-        )
+    # Homepage elements
+    homepage_elements = {
+        "logo": "Toyota logo",
+        "menu_button": "Menu button",
+        "search_button": "Search button",
+        "vehicles_link": "Vehicles navigation link"
+    }
 
-        # Vehicles page elements
-        vehicles_elements = {
-            "page_heading": "All Vehicles",
-            "first_vehicle_card": "First vehicle card",
-            "vehicle_grid": "Vehicle grid container"
-        }
-        all_discoveries["vehicles"] = discover_page_elements(
-            page, "https://www.toyota.com/vehicles", vehicles_elements
-        )
+    # Vehicles page elements
+    vehicles_elements = {
+        "page_heading": "All Vehicles",
+        "first_vehicle_card": "First vehicle card",
+        "vehicle_grid": "Vehicle grid container"
+    }
 
-        # Dealers page elements
-        dealers_elements = {
-            "zip_input": "Zip code input",
-            "search_button": "Search button",
-            "dealer_results": "Dealer results container"
-        }
-        all_discoveries["dealers"] = discover_page_elements(
-            page, "https://www.toyota.com/dealers", dealers_elements
-        )
+    # Dealers page elements
+    dealers_elements = {
+        "zip_input": "Zip code input",
+        "search_button": "Search button",
+        "dealer_results": "Dealer results container"
+    }
 
-        browser.close()
+    all_discoveries = asyncio.run(discover_all({
+        "homepage": ("https://www.toyota.com", homepage_elements),
+        "vehicles": ("https://www.toyota.com/vehicles", vehicles_elements),
+        "dealers": ("https://www.toyota.com/dealers", dealers_elements),
+    }))
 
     # Save discoveries
     output_file = "test_data/discovered_selectors.json"
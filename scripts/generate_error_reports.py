@@ -12,6 +12,7 @@ Or run after specific tests to generate reports for those errors.
 """
 
 import sys
+from dataclasses import dataclass
 from pathlib import Path
 
 # Add src to path
@@ -21,59 +22,72 @@ from src.reporting.error_reporter import ErrorReporter
 from datetime import datetime
 
 
+@dataclass(slots=True)
+class MockAnomaly:
+    """Anomaly-like object matching the attributes ErrorReporter reads"""
+    type: str
+    severity: str
+    message: str
+    timestamp: str
+    page_url: str
+    details: dict
+
+
 def create_sample_errors():
     """Create sample errors for demonstration."""
+    # Batch timestamp shared by all samples, not a per-anomaly capture time
+    now = datetime.now().isoformat()
+
     # Simulate errors that would be detected during testing
-    sample_errors = [
-        {
-            'type': 'page_error',
-            'severity': 'critical',
-            'message': 'The play() request was interrupted by a call to pause(). https://goo.gl/LdLk22',
-            'timestamp': datetime.now().isoformat(),
-            'page_url': 'https://www.toyota.com/camry',
-            'details': {}
-        },
-        {
-            'type': 'network_error',
-            'severity': 'critical',
-            'message': 'HTTP 503: https://d.agkn.com/pixel/9343/?che=140694558&mvcsid=59988629724403261381975705367329781651',
-            'timestamp': datetime.now().isoformat(),
-            'page_url': 'https://www.toyota.com',
-            'details': {
+    return [
+        MockAnomaly(
+            type='page_error',
+            severity='critical',
+            message=(
+                'The play() request was interrupted by a call to pause(). '
+                'https://goo.gl/LdLk22'
+            ),
+            timestamp=now,
+            page_url='https://www.toyota.com/camry',
+            details={}
+        ),
+        MockAnomaly(
+            type='network_error',
+            severity='critical',
+            message=(
+                'HTTP 503: https://d.agkn.com/pixel/9343/'
+                '?che=140694558&mvcsid=59988629724403261381975705367329781651'
+            ),
+            timestamp=now,
+            page_url='https://www.toyota.com',
+            details={
                 'status': 503,
-                'url': 'https://d.agkn.com/pixel/9343/?che=140694558&mvcsid=59988629724403261381975705367329781651'
+                'url': (
+                    'https://d.agkn.com/pixel/9343/'
+                    '?che=140694558&mvcsid=59988629724403261381975705367329781651'
+                ),
             }
-        },
-        {
-            'type': 'page_error',
-            'severity': 'critical',
-            'message': 'Uncaught (in promise) Unable to retrieve dealer details for dealer code: 12166',
-            'timestamp': datetime.now().isoformat(),
-            'page_url': 'https://www.toyota.com/camry',
-            'details': {}
-        },
-        {
-            'type': 'page_error',
-            'severity': 'critical',
-            'message': "Cannot read properties of undefined (reading 'remove')",
-            'timestamp': datetime.now().isoformat(),
-            'page_url': 'https://www.toyota.com/rav4/',
-            'details': {}
-        }
+        ),
+        MockAnomaly(
+            type='page_error',
+            severity='critical',
+            message=(
+                'Uncaught (in promise) Unable to retrieve dealer details for dealer code: 12166'
+            ),
+            timestamp=now,
+            page_url='https://www.toyota.com/camry',
+            details={}
+        ),
+        MockAnomaly(
+            type='page_error',
+            severity='critical',
+            message="Cannot read properties of undefined (reading 'remove')",
+            timestamp=now,
+            page_url='https://www.toyota.com/rav4/',
+            details={}
+        ),
     ]
 
-    # Convert to anomaly-like objects
-    class MockAnomaly:
-        def __init__(self, data):
-            self.type = data['type']
-            self.severity = data['severity']
-            self.message = data['message']
-            self.timestamp = data['timestamp']
-            self.page_url = data['page_url']
-            self.details = data['details']
-
-    return [MockAnomaly(e) for e in sample_errors]
-
 
 def main():
     """Generate sample error reports."""
@@ -88,6 +102,11 @@ def main():
     # Create sample errors (in real usage, these come from AnomalyDetector)
     anomalies = create_sample_errors()
 
+    # Collapse repeats of the same error (e.g. one pixel URL with different session IDs)
+    total = len(anomalies)
+    anomalies = reporter.deduplicate_anomalies(anomalies)
+    print(f"🧹 Deduplicated {total} errors to {len(anomalies)} unique")
+
     print(f"📊 Generating reports for {len(anomalies)} detected errors...")
     print()
 
@@ -4,22 +4,161 @@ Anomaly Detection System
 Monitors and detects anomalies in performance, console errors, network requests,
 and user behavior during E2E testing.
 """
+import hashlib
 import json
+import re
 import time
-from dataclasses import asdict, dataclass
+import weakref
+from collections import Counter, deque
+from contextlib import closing
+from dataclasses import dataclass, field
 from datetime import datetime
+from itertools import compress
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
+import orjson
 from anthropic import Anthropic
 from openai import OpenAI
 from playwright.sync_api import Page, Response
 
 from src.config.constants import PERFORMANCE_BUDGETS, AnomalyType
 from src.config.settings import settings
-
-
-@dataclass
+from src.core.utils.helpers import write_bytes_atomic
+
+# Known website bugs that should not fail tests, matched in one pass against the
+# lowercased message
+_KNOWN_WEBSITE_BUG_RE = re.compile(
+    "|".join(
+        [
+            # Video autoplay errors (both play() and pause() present)
+            r"^(?=[\s\S]*play\(\))(?=[\s\S]*pause\(\))",
+            # Dealer lookup errors
+            "12166",
+            "12161",
+            "dgid",
+            # JavaScript null/undefined errors
+            "cannot read properties of undefined",
+            "cannot read properties of null",
+            # Third-party service errors
+            "http 503",
+            # AWS WAF CAPTCHA registration errors
+            "awswaf-captcha",
+            "customelementregistry",
+            # MutationObserver errors
+            "mutationobserver",
+            # Image 403 errors
+            "http 403",
+        ]
+    )
+)
+
+# Number of recent console messages kept in memory and included in reports
+_CONSOLE_BUFFER_SIZE = 50
+
+# Static asset types whose successful traffic is never interesting to the detector
+_STATIC_RESOURCE_TYPES = frozenset({"image", "font", "media", "stylesheet"})
+
+# Collects navigation, paint and resource metrics in a single pass and compares
+# them against the budgets passed in ({key: [metric name, budget]}), so budget
+# checks need no second round-trip
+_PERFORMANCE_METRICS_JS = """(budgets) => {
+    const perfEntries = performance.getEntriesByType('navigation')[0];
+    const paintEntries = performance.getEntriesByType('paint');
+    const resources = performance.getEntriesByType('resource');
+
+    let totalTransferSize = 0;
+    for (let i = 0; i < resources.length; i++) {
+        totalTransferSize += resources[i].transferSize || 0;
+    }
+
+    const firstContentfulPaint =
+        paintEntries.find(e => e.name === 'first-contentful-paint')?.startTime || 0;
+    const loadComplete = perfEntries.loadEventEnd - perfEntries.loadEventStart;
+
+    const metrics = {
+        // Navigation timing
+        domContentLoaded:
+            perfEntries.domContentLoadedEventEnd - perfEntries.domContentLoadedEventStart,
+        loadComplete: loadComplete,
+        domInteractive: perfEntries.domInteractive,
+
+        // Paint timing
+        firstPaint: paintEntries.find(e => e.name === 'first-paint')?.startTime || 0,
+        firstContentfulPaint: firstContentfulPaint,
+
+        // Resource timing
+        totalRequests: resources.length,
+        totalTransferSize: totalTransferSize,
+    };
+
+    const budgetsExceeded = {};
+    for (const [key, [metric, budget]] of Object.entries(budgets)) {
+        budgetsExceeded[key] = (metrics[metric] || 0) > budget;
+    }
+    return {...metrics, budgetsExceeded: budgetsExceeded};
+}"""
+
+# Budget checks as (budget key, metric key, budget getter, metric label, severity,
+# message prefix). The page computes a budgetsExceeded flag per row, so a row can
+# check any metric _PERFORMANCE_METRICS_JS collects.
+_BUDGET_CHECKS = (
+    (
+        "fcp",
+        "firstContentfulPaint",
+        lambda: PERFORMANCE_BUDGETS["FCP"],
+        "FCP",
+        "medium",
+        "First Contentful Paint exceeded budget",
+    ),
+    (
+        "pageLoad",
+        "loadComplete",
+        lambda: settings.max_page_load_time,
+        "PageLoad",
+        "high",
+        "Page load time exceeded",
+    ),
+)
+
+
+def _performance_budgets() -> Dict[str, float]:
+    """Current budget per _BUDGET_CHECKS key"""
+    return {key: budget() for key, _, budget, *_ in _BUDGET_CHECKS}
+
+
+# Visibility of each required-section selector in one round-trip: true/false, or
+# null when nothing matches (or the selector is not valid CSS)
+_SECTIONS_VISIBILITY_JS = """(selectors) => selectors.map((selector) => {
+    let el;
+    try {
+        el = document.querySelector(selector);
+    } catch (e) {
+        return null;
+    }
+    if (!el) {
+        return null;
+    }
+    const rect = el.getBoundingClientRect();
+    return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== 'hidden';
+})"""
+
+# Above this many anomalies the AI prompt carries per-cluster samples and counts
+# instead of every anomaly
+_AI_PROMPT_MAX_ANOMALIES = 200
+_AI_PROMPT_SAMPLES_PER_CLUSTER = 3
+
+# JSON in a ```json fenced block, or the outermost {...} span of an AI response
+_JSON_FENCE_RE = re.compile(r"```json\n(.*?)\n```", re.DOTALL)
+_JSON_OBJECT_RE = re.compile(r"(\{.*\})", re.DOTALL)
+
+
+def _format_timestamp(timestamp: float) -> str:
+    """Format an event timestamp (epoch seconds) as ISO 8601"""
+    return datetime.fromtimestamp(timestamp).isoformat()
+
+
+@dataclass(slots=True)
 class Anomaly:
     """Anomaly data class"""
 
@@ -29,25 +168,81 @@ class Anomaly:
     timestamp: str
     details: Dict[str, Any]
     page_url: str
+    _message_lower: str = field(default="", init=False, repr=False, compare=False)
+    _as_dict: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Normalized once so known-bug filtering never re-lowercases the message
+        self._message_lower = str(self.message).lower()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable dict form, built once and reused (details are not copied again)"""
+        if self._as_dict is None:
+            self._as_dict = {
+                "type": self.type,
+                "severity": self.severity,
+                "message": self.message,
+                "timestamp": self.timestamp,
+                "details": self.details,
+                "page_url": self.page_url,
+            }
+        return self._as_dict
 
 
 class AnomalyDetector:
     """Detect and analyze anomalies during test execution"""
 
-    def __init__(self, page: Page, use_claude: bool = True):
+    def __init__(
+        self,
+        page: Page,
+        use_claude: bool = True,
+        event_log_path: Optional[Path] = None,
+        log_events: bool = False,
+    ):
         """
         Initialize anomaly detector
 
         Args:
             page: Playwright page object
             use_claude: Use Claude for AI analysis
+            event_log_path: JSONL file that every anomaly, console message and request
+                is appended to (enables the event log)
+            log_events: Enable the event log at a new file under report_dir/anomaly_events
         """
         self.page = page
         self.anomalies: List[Anomaly] = []
-        self.console_messages: List[Dict] = []
-        self.network_requests: List[Dict] = []
+        # Type and severity columns parallel to self.anomalies, so filters scan
+        # plain string lists instead of reading attributes off each Anomaly
+        self._types: List[str] = []
+        self._severities: List[str] = []
+        # Only the most recent console messages are kept; the event log, if enabled, has them all
+        self.console_messages: deque = deque(maxlen=_CONSOLE_BUFFER_SIZE)
+        self.network_request_count = 0
+        self._skipped_requests = 0
         self.performance_metrics: Dict[str, float] = {}
 
+        # perf_counter() start time of each in-flight request, for response times
+        self._request_starts: Dict[Any, float] = {}
+
+        # First anomaly recorded for each (console type, text), for deduplication
+        self._console_seen: Dict[Tuple[str, str], Anomaly] = {}
+
+        # Running aggregates so summaries don't rescan the anomaly list
+        self._counts_by_type: Counter = Counter()
+        self._counts_by_severity: Counter = Counter()
+
+        # Optional full event stream on disk, opened on the first event and closed by
+        # close() or when the detector is garbage collected
+        if log_events and event_log_path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            event_log_path = (
+                settings.report_dir / "anomaly_events" / f"events_{timestamp}_{id(self):x}.jsonl"
+            )
+        self.event_log_path = event_log_path
+        self._event_log = None
+        self._event_log_finalizer: Optional[weakref.finalize] = None
+        self._event_log_closed = False
+
         # Initialize AI client
         if use_claude and settings.anthropic_api_key:
             self.ai_client = Anthropic(api_key=settings.anthropic_api_key)
@@ -64,6 +259,10 @@ class AnomalyDetector:
 
     def _setup_listeners(self):
         """Set up event listeners for anomaly detection"""
+        # Main-frame URL, kept current on navigation so records don't query the page
+        self._page_url = self.page.url
+        self.page.on("framenavigated", self._handle_frame_navigated)
+
         # Console message listener
         self.page.on("console", self._handle_console_message)
 
@@ -77,24 +276,50 @@ class AnomalyDetector:
         # Request failed listener
         self.page.on("requestfailed", self._handle_request_failed)
 
+    def _handle_frame_navigated(self, frame):
+        """Track the main frame's URL"""
+        if frame == self.page.main_frame:
+            self._page_url = frame.url
+
     def _handle_console_message(self, msg):
         """Handle console messages"""
         console_data = {
             "type": msg.type,
             "text": msg.text,
             "location": msg.location,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": time.time(),  # Formatted lazily in generate_report
         }
         self.console_messages.append(console_data)
+        self._log_event("console", console_data)
 
         # Check for errors or warnings
         if msg.type in ["error", "warning"]:
+            # Repeats of the same message only bump the first anomaly's count
+            key = (msg.type, msg.text)
+            seen = self._console_seen.get(key)
+            if seen is not None:
+                seen.details["occurrence_count"] += 1
+                # The logged anomaly keeps its first count; log each increment after it
+                self._log_event(
+                    "anomaly_repeat",
+                    {
+                        "message": seen.message,
+                        "occurrence_count": seen.details["occurrence_count"],
+                        "timestamp": console_data["timestamp"],
+                    },
+                )
+                return
+
             severity = "high" if msg.type == "error" else "medium"
-            self._record_anomaly(
+            self._console_seen[key] = self._record_anomaly(
                 anomaly_type=AnomalyType.CONSOLE_ERROR.value,
                 severity=severity,
                 message=f"Console {msg.type}: {msg.text}",
-                details=console_data,
+                details={
+                    **console_data,
+                    "timestamp": _format_timestamp(console_data["timestamp"]),
+                    "occurrence_count": 1,
+                },
             )
 
     def _handle_page_error(self, error):
@@ -108,16 +333,28 @@ class AnomalyDetector:
 
     def _handle_request(self, request):
         """Handle network requests"""
+        self.network_request_count += 1
+
+        # Static assets are only counted, not logged
+        if request.resource_type in _STATIC_RESOURCE_TYPES:
+            self._skipped_requests += 1
+            return
+
         request_data = {
             "url": request.url,
             "method": request.method,
             "resource_type": request.resource_type,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": time.time(),  # Epoch seconds, no per-event ISO formatting
         }
-        self.network_requests.append(request_data)
+        self._request_starts[request] = time.perf_counter()
+        self._log_event("request", request_data)
 
     def _handle_response(self, response: Response):
         """Handle network responses"""
+        # Successful static asset responses need no further inspection
+        if response.status < 400 and response.request.resource_type in _STATIC_RESOURCE_TYPES:
+            return
+
         # Check for failed responses
         if response.status >= 400:
             severity = "critical" if response.status >= 500 else "high"
@@ -132,10 +369,10 @@ class AnomalyDetector:
                 },
             )
 
-        # Check for slow responses
-        timing = response.request.timing
-        if timing and "responseEnd" in timing:
-            response_time = timing["responseEnd"] - timing["requestStart"]
+        # Check for slow responses (time from request to response headers)
+        start = self._request_starts.pop(response.request, None)
+        if start is not None:
+            response_time = round((time.perf_counter() - start) * 1000)
             if response_time > 5000:  # 5 seconds
                 self._record_anomaly(
                     anomaly_type=AnomalyType.PERFORMANCE.value,
@@ -150,6 +387,7 @@ class AnomalyDetector:
 
     def _handle_request_failed(self, request):
         """Handle failed requests"""
+        self._request_starts.pop(request, None)
         self._record_anomaly(
             anomaly_type=AnomalyType.NETWORK_ERROR.value,
             severity="high",
@@ -165,32 +403,16 @@ class AnomalyDetector:
     def collect_performance_metrics(self) -> Dict[str, float]:
         """Collect Web Vitals and performance metrics"""
         try:
-            # Collect performance metrics using Performance API
+            # Collect performance metrics and budget checks in one round-trip
+            budgets = _performance_budgets()
             metrics = self.page.evaluate(
-                """() => {
-                const perfEntries = performance.getEntriesByType('navigation')[0];
-                const paintEntries = performance.getEntriesByType('paint');
-
-                return {
-                    // Navigation timing
-                    domContentLoaded: perfEntries.domContentLoadedEventEnd - perfEntries.domContentLoadedEventStart,
-                    loadComplete: perfEntries.loadEventEnd - perfEntries.loadEventStart,
-                    domInteractive: perfEntries.domInteractive,
-
-                    // Paint timing
-                    firstPaint: paintEntries.find(e => e.name === 'first-paint')?.startTime || 0,
-                    firstContentfulPaint: paintEntries.find(e => e.name === 'first-contentful-paint')?.startTime || 0,
-
-                    // Resource timing
-                    totalRequests: performance.getEntriesByType('resource').length,
-                    totalTransferSize: performance.getEntriesByType('resource')
-                        .reduce((sum, r) => sum + (r.transferSize || 0), 0),
-                };
-            }"""
+                _PERFORMANCE_METRICS_JS,
+                {key: [metric_key, budgets[key]] for key, metric_key, *_ in _BUDGET_CHECKS},
             )
+            exceeded = metrics.pop("budgetsExceeded")
 
             self.performance_metrics = metrics
-            self._check_performance_budgets(metrics)
+            self._check_performance_budgets(metrics, exceeded)
 
             return metrics
 
@@ -198,33 +420,34 @@ class AnomalyDetector:
             print(f"Failed to collect performance metrics: {e}")
             return {}
 
-    def _check_performance_budgets(self, metrics: Dict[str, float]):
-        """Check if performance metrics exceed budgets"""
-        # Check First Contentful Paint
-        if "firstContentfulPaint" in metrics:
-            fcp = metrics["firstContentfulPaint"]
-            if fcp > PERFORMANCE_BUDGETS["FCP"]:
-                self._record_anomaly(
-                    anomaly_type=AnomalyType.PERFORMANCE.value,
-                    severity="medium",
-                    message=f"First Contentful Paint exceeded budget: {fcp}ms > {PERFORMANCE_BUDGETS['FCP']}ms",
-                    details={"metric": "FCP", "value": fcp, "budget": PERFORMANCE_BUDGETS["FCP"]},
-                )
+    def _check_performance_budgets(
+        self, metrics: Dict[str, float], exceeded: Optional[Dict[str, bool]] = None
+    ):
+        """
+        Check if performance metrics exceed budgets
 
-        # Check page load time
-        if "loadComplete" in metrics:
-            load_time = metrics["loadComplete"]
-            if load_time > settings.max_page_load_time:
-                self._record_anomaly(
-                    anomaly_type=AnomalyType.PERFORMANCE.value,
-                    severity="high",
-                    message=f"Page load time exceeded: {load_time}ms > {settings.max_page_load_time}ms",
-                    details={
-                        "metric": "PageLoad",
-                        "value": load_time,
-                        "budget": settings.max_page_load_time,
-                    },
-                )
+        Args:
+            metrics: Collected performance metrics
+            exceeded: Budget results already computed in the page; computed here if omitted
+        """
+        budgets = _performance_budgets()
+        if exceeded is None:
+            exceeded = {
+                key: metrics.get(metric_key, 0) > budgets[key]
+                for key, metric_key, *_ in _BUDGET_CHECKS
+            }
+
+        # Record one anomaly per violated budget
+        for key, metric_key, _, label, severity, description in _BUDGET_CHECKS:
+            if not exceeded.get(key):
+                continue
+            value = metrics[metric_key]
+            self._record_anomaly(
+                anomaly_type=AnomalyType.PERFORMANCE.value,
+                severity=severity,
+                message=f"{description}: {value}ms > {budgets[key]}ms",
+                details={"metric": label, "value": value, "budget": budgets[key]},
+            )
 
     def detect_behavioral_anomalies(self, expected_behavior: Dict[str, Any]) -> List[Anomaly]:
         """
@@ -245,51 +468,73 @@ class AnomalyDetector:
 
         # Check for required elements
         if "required_sections" in expected_behavior:
-            for section in expected_behavior["required_sections"]:
-                try:
-                    element = self.page.locator(f"[data-section='{section}'], #{section}, .{section}")
-                    if not element.is_visible(timeout=5000):
-                        self._record_anomaly(
-                            anomaly_type=AnomalyType.BEHAVIORAL.value,
-                            severity="high",
-                            message=f"Required section not visible: {section}",
-                            details={"section": section},
-                        )
-                except Exception:
+            sections = expected_behavior["required_sections"]
+            selectors = [f"[data-section='{s}'], #{s}, .{s}" for s in sections]
+            try:
+                visibility = self.page.evaluate(_SECTIONS_VISIBILITY_JS, selectors)
+            except Exception:
+                visibility = [None] * len(sections)
+
+            for section, visible in zip(sections, visibility):
+                if visible is None:
                     self._record_anomaly(
                         anomaly_type=AnomalyType.BEHAVIORAL.value,
                         severity="high",
                         message=f"Required section not found: {section}",
                         details={"section": section},
                     )
+                elif not visible:
+                    self._record_anomaly(
+                        anomaly_type=AnomalyType.BEHAVIORAL.value,
+                        severity="high",
+                        message=f"Required section not visible: {section}",
+                        details={"section": section},
+                    )
 
         return behavioral_anomalies
 
     def _record_anomaly(
         self, anomaly_type: str, severity: str, message: str, details: Dict[str, Any]
-    ):
-        """Record an anomaly"""
+    ) -> Anomaly:
+        """Record an anomaly (details are shallow-copied, so the caller's dict is not shared)"""
         anomaly = Anomaly(
             type=anomaly_type,
             severity=severity,
             message=message,
             timestamp=datetime.now().isoformat(),
-            details=details,
-            page_url=self.page.url,
+            details=dict(details),
+            page_url=self._page_url,
         )
         self.anomalies.append(anomaly)
+        self._types.append(anomaly_type)
+        self._severities.append(severity)
+        self._counts_by_type[anomaly_type] += 1
+        self._counts_by_severity[severity] += 1
+        self._log_event("anomaly", anomaly.to_dict())
 
         # Log critical anomalies immediately
         if severity == "critical":
             print(f"[CRITICAL ANOMALY] {message}")
 
+        return anomaly
+
+    def _log_event(self, kind: str, data: Dict[str, Any]):
+        """Append one event as a JSON line to the event log, if enabled"""
+        if self.event_log_path is None or self._event_log_closed:
+            return
+        if self._event_log is None:
+            self.event_log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._event_log = open(self.event_log_path, "ab", buffering=1 << 16)
+            self._event_log_finalizer = weakref.finalize(self, self._event_log.close)
+        self._event_log.write(orjson.dumps({"event": kind, **data}, default=str) + b"\n")
+
     def get_anomalies_by_type(self, anomaly_type: str) -> List[Anomaly]:
         """Get anomalies filtered by type"""
-        return [a for a in self.anomalies if a.type == anomaly_type]
+        return list(compress(self.anomalies, map(anomaly_type.__eq__, self._types)))
 
     def get_critical_anomalies(self) -> List[Anomaly]:
         """Get all critical anomalies"""
-        return [a for a in self.anomalies if a.severity == "critical"]
+        return list(compress(self.anomalies, map("critical".__eq__, self._severities)))
 
     def get_test_blocking_errors(self) -> List[Anomaly]:
         """
@@ -304,65 +549,54 @@ class AnomalyDetector:
         critical = self.get_critical_anomalies()
 
         # Filter out known website errors that don't affect test functionality
-        test_blocking = []
-        for anomaly in critical:
-            message_lower = str(anomaly.message).lower()
-
-            # Skip known website bugs (these get reported separately)
-            if 'play()' in message_lower and 'pause()' in message_lower:
-                # Video autoplay errors - website bug, not test failure
-                continue
-            elif '12166' in anomaly.message or '12161' in anomaly.message or 'dgid' in message_lower:
-                # Dealer lookup errors - website bug, not test failure
-                continue
-            elif 'cannot read properties of undefined' in message_lower or 'cannot read properties of null' in message_lower:
-                # JavaScript null/undefined errors - website bug, not test failure
-                continue
-            elif 'http 503' in message_lower:
-                # Third-party service errors - website bug, not test failure
-                continue
-            elif 'awswaf-captcha' in message_lower or 'customelementregistry' in message_lower:
-                # AWS WAF CAPTCHA registration errors - website bug, not test failure
-                continue
-            elif 'mutationobserver' in message_lower:
-                # MutationObserver errors - website bug, not test failure
-                continue
-            elif 'http 403' in message_lower:
-                # Image 403 errors - website bug, not test failure
-                continue
-            else:
-                # This is an actual test-blocking error
-                test_blocking.append(anomaly)
-
-        return test_blocking
+        # (these get reported separately)
+        return [
+            anomaly
+            for anomaly in critical
+            if not _KNOWN_WEBSITE_BUG_RE.search(anomaly._message_lower)
+        ]
 
     def analyze_anomalies_with_ai(self) -> Dict[str, Any]:
         """Use AI to analyze all detected anomalies and provide insights"""
         if not self.ai_client or not self.anomalies:
             return {"error": "No AI client or no anomalies to analyze"}
 
+        # Reuse a previous analysis of the same anomaly set
+        key_fields = [(a.type, a.severity, a.message) for a in self.anomalies]
+        cache_key = hashlib.blake2b(orjson.dumps([self.ai_model, *key_fields])).hexdigest()
+        cache_path = settings.report_dir / "ai_cache" / f"{cache_key}.json"
+        try:
+            return orjson.loads(cache_path.read_bytes())
+        except (FileNotFoundError, orjson.JSONDecodeError):
+            pass
+
         # Prepare anomaly data
         anomaly_summary = {
             "total_anomalies": len(self.anomalies),
-            "by_type": {},
-            "by_severity": {},
-            "anomalies": [asdict(a) for a in self.anomalies],
+            "by_type": dict(self._counts_by_type),
+            "by_severity": dict(self._counts_by_severity),
         }
-
-        for anomaly in self.anomalies:
-            # Count by type
-            anomaly_summary["by_type"][anomaly.type] = (
-                anomaly_summary["by_type"].get(anomaly.type, 0) + 1
-            )
-            # Count by severity
-            anomaly_summary["by_severity"][anomaly.severity] = (
-                anomaly_summary["by_severity"].get(anomaly.severity, 0) + 1
-            )
+        if len(self.anomalies) > _AI_PROMPT_MAX_ANOMALIES:
+            # Too many to send: a few samples per (type, severity) cluster plus counts
+            clusters: Dict[Tuple[str, str], List[Anomaly]] = {}
+            for key, anomaly in zip(zip(self._types, self._severities), self.anomalies):
+                clusters.setdefault(key, []).append(anomaly)
+            anomaly_summary["clusters"] = [
+                {"type": t, "severity": s, "count": len(members)}
+                for (t, s), members in clusters.items()
+            ]
+            anomaly_summary["anomalies"] = [
+                a.to_dict()
+                for members in clusters.values()
+                for a in members[:_AI_PROMPT_SAMPLES_PER_CLUSTER]
+            ]
+        else:
+            anomaly_summary["anomalies"] = [a.to_dict() for a in self.anomalies]
 
         prompt = f"""
         Analyze the following anomalies detected during E2E testing of toyota.com:
 
-        {json.dumps(anomaly_summary, indent=2)}
+        {orjson.dumps(anomaly_summary, option=orjson.OPT_INDENT_2, default=str).decode()}
 
         Provide:
         1. Root cause analysis for major issues
@@ -388,39 +622,87 @@ class AnomalyDetector:
         """
 
         try:
-            if self.use_claude:
-                response = self.ai_client.messages.create(
-                    model=self.ai_model,
-                    max_tokens=2000,
-                    messages=[{"role": "user", "content": prompt}],
-                )
-                analysis_text = response.content[0].text
-            else:
-                response = self.ai_client.chat.completions.create(
-                    model=self.ai_model,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=2000,
-                )
-                analysis_text = response.choices[0].message.content
-
-            analysis = self._extract_json(analysis_text)
-            return analysis if analysis else {"raw_response": analysis_text}
+            # Parse as soon as the braces balance and stop the stream once it does
+            chunks = []
+            depth = 0
+            opened = False
+            analysis = None
+            with closing(self._stream_ai(prompt, max_tokens=2000)) as stream:
+                for chunk in stream:
+                    chunks.append(chunk)
+                    opens = chunk.count("{")
+                    depth += opens - chunk.count("}")
+                    opened = opened or opens > 0
+                    if opened and depth == 0:
+                        analysis = self._extract_json("".join(chunks))
+                        if analysis:
+                            break
+
+            analysis_text = "".join(chunks)
+            if not analysis:
+                analysis = self._extract_json(analysis_text)
+            if not analysis:
+                return {"raw_response": analysis_text}
+
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            cache_path.write_bytes(orjson.dumps(analysis))
+            return analysis
 
         except Exception as e:
             return {"error": f"AI analysis failed: {str(e)}"}
 
+    def _stream_ai(self, prompt: str, max_tokens: int) -> Iterator[str]:
+        """
+        Call the AI API and yield the response text as it is generated
+
+        Closing the generator early closes the underlying stream.
+
+        Args:
+            prompt: Prompt text
+            max_tokens: Max tokens in the response
+
+        Yields:
+            Response text chunks
+        """
+        if self.use_claude:
+            with self.ai_client.messages.stream(
+                model=self.ai_model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+            ) as stream:
+                yield from stream.text_stream
+        else:
+            stream = self.ai_client.chat.completions.create(
+                model=self.ai_model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            try:
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                stream.close()
+
     def _extract_json(self, text: str) -> Optional[Dict]:
         """Extract JSON from AI response"""
-        import re
+        # Fast path: the response is a bare JSON object
+        stripped = text.strip()
+        if stripped.startswith("{") and stripped.endswith("}"):
+            try:
+                return json.loads(stripped)
+            except json.JSONDecodeError:
+                pass
 
-        json_match = re.search(r"```json\n(.*?)\n```", text, re.DOTALL)
+        json_match = _JSON_FENCE_RE.search(text)
         if json_match:
             try:
                 return json.loads(json_match.group(1))
             except json.JSONDecodeError:
                 pass
 
-        json_match = re.search(r"(\{.*\})", text, re.DOTALL)
+        json_match = _JSON_OBJECT_RE.search(text)
         if json_match:
             try:
                 return json.loads(json_match.group(1))
@@ -437,29 +719,25 @@ class AnomalyDetector:
 
         report = {
             "timestamp": datetime.now().isoformat(),
-            "page_url": self.page.url,
+            "page_url": self._page_url,
             "total_anomalies": len(self.anomalies),
-            "anomalies_by_type": {},
-            "anomalies_by_severity": {},
+            "anomalies_by_type": dict(self._counts_by_type),
+            "anomalies_by_severity": dict(self._counts_by_severity),
             "performance_metrics": self.performance_metrics,
-            "console_messages": self.console_messages[-50:],  # Last 50 messages
+            "console_messages": [
+                {**msg, "timestamp": _format_timestamp(msg["timestamp"])}
+                for msg in self.console_messages
+            ],
             "network_summary": {
-                "total_requests": len(self.network_requests),
-                "failed_requests": len(
-                    [a for a in self.anomalies if a.type == AnomalyType.NETWORK_ERROR.value]
-                ),
+                "total_requests": self.network_request_count,
+                "skipped_static_requests": self._skipped_requests,
+                "failed_requests": self._counts_by_type[AnomalyType.NETWORK_ERROR.value],
             },
-            "anomalies": [asdict(a) for a in self.anomalies],
+            "anomalies": [a.to_dict() for a in self.anomalies],
+            "event_log": str(self.event_log_path) if self.event_log_path else None,
         }
-
-        # Group anomalies
-        for anomaly in self.anomalies:
-            report["anomalies_by_type"][anomaly.type] = (
-                report["anomalies_by_type"].get(anomaly.type, 0) + 1
-            )
-            report["anomalies_by_severity"][anomaly.severity] = (
-                report["anomalies_by_severity"].get(anomaly.severity, 0) + 1
-            )
+        if self._event_log is not None:
+            self._event_log.flush()
 
         # Add AI analysis if available
         if settings.enable_anomaly_detection:
@@ -467,16 +745,38 @@ class AnomalyDetector:
             report["ai_analysis"] = ai_analysis
 
         # Save report
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "w") as f:
-            json.dump(report, f, indent=2)
+        write_bytes_atomic(
+            orjson.dumps(report, option=orjson.OPT_INDENT_2, default=str), output_path
+        )
 
         print(f"Anomaly report generated: {output_path}")
         return output_path
 
+    def close(self):
+        """Flush and close the event log; later events are no longer logged"""
+        if self._event_log_finalizer is not None:
+            self._event_log_finalizer()
+        self._event_log = None
+        self._event_log_closed = True
+
+    def __enter__(self) -> "AnomalyDetector":
+        """Use the detector as a context manager that closes the event log on exit"""
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Close the event log"""
+        self.close()
+
     def reset(self):
         """Reset anomaly detection state"""
         self.anomalies = []
-        self.console_messages = []
-        self.network_requests = []
+        self._types = []
+        self._severities = []
+        self.console_messages.clear()
+        self.network_request_count = 0
+        self._skipped_requests = 0
         self.performance_metrics = {}
+        self._request_starts.clear()
+        self._console_seen.clear()
+        self._counts_by_type.clear()
+        self._counts_by_severity.clear()
@@ -5,17 +5,61 @@ Tracks test coverage across pages, features, and user flows.
 Uses AI to identify gaps and suggest missing test scenarios.
 """
 import json
-from collections import defaultdict
-from dataclasses import dataclass, asdict
+import re
+import sqlite3
+from collections import deque
+from dataclasses import dataclass, asdict, field
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from string import Template
+from typing import Any, Dict, List, Optional, Set, Tuple
 
+import orjson
 from anthropic import Anthropic
 from openai import OpenAI
 
+from src.ai.llm_cache import cached_llm
+from src.ai.resilience import AI_CIRCUIT_BREAKER, TRANSIENT_AI_ERRORS
 from src.config.constants import ToyotaPages, VehicleModels
 from src.config.settings import settings
+from src.core.utils.helpers import retry_on_exception, write_bytes_atomic
+
+# JSON in a ```json fenced block, or the outermost array/object of an AI response
+_JSON_FENCE_RE = re.compile(r"```json\n(.*?)\n```", re.DOTALL)
+_JSON_RAW_RE = re.compile(r"(\[.*\]|\{.*\})", re.DOTALL)
+
+# Prompt for suggest_tests_with_ai
+_SUGGEST_TESTS_PROMPT = Template(
+    """Analyze the test coverage for toyota.com and suggest missing test scenarios:
+
+Current Coverage:
+$coverage_stats
+
+$focus
+
+Suggest 5-10 high-priority test scenarios that would improve coverage, considering:
+1. Untested pages and features
+2. Critical user journeys
+3. Edge cases and error scenarios
+4. Mobile and accessibility testing
+5. Performance and visual regression
+
+Return as JSON array:
+[
+    {
+        "test_name": "descriptive_test_name",
+        "priority": "critical|high|medium|low",
+        "description": "what this test validates",
+        "covers": ["page1", "flow1", "feature1"],
+        "type": "smoke|regression|visual|performance|accessibility",
+        "estimated_value": "why this test is important"
+    }
+]
+"""
+)
+
+# Number of recent test executions kept in memory
+_HISTORY_BUFFER_SIZE = 200
 
 
 @dataclass
@@ -27,7 +71,11 @@ class CoverageItem:
     tested: bool
     test_count: int
     last_tested: Optional[str]
-    test_files: List[str]
+    test_files: Set[str] = field(default_factory=set)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializable dict form (test files as a sorted list)"""
+        return {**asdict(self), "test_files": sorted(self.test_files)}
 
 
 class CoverageAnalyzer:
@@ -41,8 +89,20 @@ class CoverageAnalyzer:
             use_claude: Use Claude for AI analysis
         """
         self.coverage_data: Dict[str, CoverageItem] = {}
-        self.test_execution_history: List[Dict] = []
-        self.coverage_db_path = Path("test_data/coverage.json")
+        # Per-type totals and untested/low-coverage keys, kept current by _add_item and
+        # record_test_execution so queries don't rescan coverage_data
+        self._by_type: Dict[str, Dict[str, Any]] = {}
+        # Recent executions only; the full history lives in the database
+        self.test_execution_history: deque = deque(maxlen=_HISTORY_BUFFER_SIZE)
+        self._total_executions = 0
+        self.coverage_db_path = Path("test_data/coverage.sqlite")
+        # Pre-SQLite JSON database, imported once if the SQLite file doesn't exist yet
+        self.legacy_coverage_db_path = Path("test_data/coverage.json")
+        # Coverage keys changed since the last save
+        self._dirty: Set[str] = set()
+        # Bumped on every recorded execution; keys the rendered coverage stats cache
+        self._version = 0
+        self._coverage_stats_cache: Tuple[int, str] = (-1, "")
 
         # Initialize AI client
         if use_claude and settings.anthropic_api_key:
@@ -65,27 +125,35 @@ class CoverageAnalyzer:
         for page in ToyotaPages:
             key = f"page:{page.value}"
             if key not in self.coverage_data:
-                self.coverage_data[key] = CoverageItem(
-                    identifier=page.value,
-                    type="page",
-                    tested=False,
-                    test_count=0,
-                    last_tested=None,
-                    test_files=[],
+                self._add_item(
+                    key,
+                    CoverageItem(
+                        identifier=page.value,
+                        type="page",
+                        tested=False,
+                        test_count=0,
+                        last_tested=None,
+                        test_files=set(),
+                    ),
                 )
+                self._dirty.add(key)
 
         # Track vehicle models
         for model in VehicleModels:
             key = f"vehicle:{model.value}"
             if key not in self.coverage_data:
-                self.coverage_data[key] = CoverageItem(
-                    identifier=model.value,
-                    type="vehicle",
-                    tested=False,
-                    test_count=0,
-                    last_tested=None,
-                    test_files=[],
+                self._add_item(
+                    key,
+                    CoverageItem(
+                        identifier=model.value,
+                        type="vehicle",
+                        tested=False,
+                        test_count=0,
+                        last_tested=None,
+                        test_files=set(),
+                    ),
                 )
+                self._dirty.add(key)
 
         # Track critical user flows
         critical_flows = [
@@ -102,14 +170,18 @@ class CoverageAnalyzer:
         for flow in critical_flows:
             key = f"flow:{flow}"
             if key not in self.coverage_data:
-                self.coverage_data[key] = CoverageItem(
-                    identifier=flow,
-                    type="flow",
-                    tested=False,
-                    test_count=0,
-                    last_tested=None,
-                    test_files=[],
+                self._add_item(
+                    key,
+                    CoverageItem(
+                        identifier=flow,
+                        type="flow",
+                        tested=False,
+                        test_count=0,
+                        last_tested=None,
+                        test_files=set(),
+                    ),
                 )
+                self._dirty.add(key)
 
     def record_test_execution(
         self, test_name: str, test_file: str, pages_visited: List[str], features_used: List[str]
@@ -126,39 +198,54 @@ class CoverageAnalyzer:
         timestamp = datetime.now().isoformat()
 
         # Record execution
-        self.test_execution_history.append(
-            {
-                "test_name": test_name,
-                "test_file": test_file,
-                "timestamp": timestamp,
-                "pages_visited": pages_visited,
-                "features_used": features_used,
-            }
-        )
-
-        # Update coverage for pages
-        for page in pages_visited:
-            key = f"page:{page}"
-            if key in self.coverage_data:
-                item = self.coverage_data[key]
-                item.tested = True
-                item.test_count += 1
-                item.last_tested = timestamp
-                if test_file not in item.test_files:
-                    item.test_files.append(test_file)
-
-        # Update coverage for features
-        for feature in features_used:
-            key = f"flow:{feature}"
+        execution = {
+            "test_name": test_name,
+            "test_file": test_file,
+            "timestamp": timestamp,
+            "pages_visited": pages_visited,
+            "features_used": features_used,
+        }
+        self.test_execution_history.append(execution)
+        self._total_executions += 1
+        self._version += 1
+
+        # Update coverage for pages and features
+        keys = [f"page:{page}" for page in pages_visited]
+        keys.extend(f"flow:{feature}" for feature in features_used)
+        for key in keys:
             if key in self.coverage_data:
                 item = self.coverage_data[key]
-                item.tested = True
+                stats = self._by_type[item.type]
+                if not item.tested:
+                    item.tested = True
+                    stats["tested"] += 1
+                    del stats["untested"][key]
                 item.test_count += 1
                 item.last_tested = timestamp
-                if test_file not in item.test_files:
-                    item.test_files.append(test_file)
-
-        self._save_coverage_database()
+                item.test_files.add(test_file)
+                if item.test_count < 2:
+                    stats["low"][key] = None
+                else:
+                    stats["low"].pop(key, None)
+                self._dirty.add(key)
+
+        # History row and coverage updates are committed together
+        self._save_coverage_database([execution])
+
+    def _add_item(self, key: str, item: CoverageItem):
+        """Add a coverage item and count it in the per-type aggregates"""
+        self.coverage_data[key] = item
+        stats = self._by_type.get(item.type)
+        if stats is None:
+            # "untested" and "low" are dicts used as insertion-ordered sets of keys
+            stats = self._by_type[item.type] = {"total": 0, "tested": 0, "untested": {}, "low": {}}
+        stats["total"] += 1
+        if not item.tested:
+            stats["untested"][key] = None
+        else:
+            stats["tested"] += 1
+            if item.test_count < 2:
+                stats["low"][key] = None
 
     def get_coverage_percentage(self, coverage_type: Optional[str] = None) -> float:
         """
@@ -170,25 +257,27 @@ class CoverageAnalyzer:
         Returns:
             Coverage percentage (0-100)
         """
-        items = self.coverage_data.values()
-
         if coverage_type:
-            items = [item for item in items if item.type == coverage_type]
+            stats = self._by_type.get(coverage_type)
+            total, tested = (stats["total"], stats["tested"]) if stats else (0, 0)
+        else:
+            total = len(self.coverage_data)
+            tested = sum(stats["tested"] for stats in self._by_type.values())
 
-        if not items:
+        if not total:
             return 0.0
 
-        tested_count = sum(1 for item in items if item.tested)
-        return (tested_count / len(items)) * 100
+        return (tested / total) * 100
 
     def get_untested_items(self, coverage_type: Optional[str] = None) -> List[CoverageItem]:
         """Get list of untested items"""
-        items = self.coverage_data.values()
-
         if coverage_type:
-            items = [item for item in items if item.type == coverage_type]
+            stats = self._by_type.get(coverage_type)
+            keys = list(stats["untested"]) if stats else []
+        else:
+            keys = [key for stats in self._by_type.values() for key in stats["untested"]]
 
-        return [item for item in items if not item.tested]
+        return [self.coverage_data[key] for key in keys]
 
     def get_coverage_gaps(self) -> Dict[str, List[str]]:
         """Identify coverage gaps"""
@@ -199,15 +288,19 @@ class CoverageAnalyzer:
             "low_coverage_items": [],
         }
 
-        for key, item in self.coverage_data.items():
-            if not item.tested:
-                if item.type == "page":
-                    gaps["untested_pages"].append(item.identifier)
-                elif item.type == "vehicle":
-                    gaps["untested_vehicles"].append(item.identifier)
-                elif item.type == "flow":
-                    gaps["untested_flows"].append(item.identifier)
-            elif item.test_count < 2:  # Items with low test count
+        for item_type, gap_key in (
+            ("page", "untested_pages"),
+            ("vehicle", "untested_vehicles"),
+            ("flow", "untested_flows"),
+        ):
+            stats = self._by_type.get(item_type)
+            if stats:
+                gaps[gap_key] = [self.coverage_data[key].identifier for key in stats["untested"]]
+
+        # Items with low test count
+        for stats in self._by_type.values():
+            for key in stats["low"]:
+                item = self.coverage_data[key]
                 gaps["low_coverage_items"].append(
                     f"{item.type}:{item.identifier} (tested {item.test_count} time(s))"
                 )
@@ -226,9 +319,8 @@ class CoverageAnalyzer:
         """
         # This is a simplified version - in production, parse actual sitemap
         known_pages = set(page.value for page in ToyotaPages)
-        tested_pages = set(
-            item.identifier for item in self.coverage_data.values() if item.type == "page" and item.tested
-        )
+        untested = set(item.identifier for item in self.get_untested_items("page"))
+        tested_pages = known_pages - untested
 
         return {
             "total_pages": len(known_pages),
@@ -252,59 +344,26 @@ class CoverageAnalyzer:
         if not self.ai_client:
             return []
 
-        # Get coverage gaps
-        gaps = self.get_coverage_gaps()
-        coverage_stats = {
-            "overall_coverage": self.get_coverage_percentage(),
-            "page_coverage": self.get_coverage_percentage("page"),
-            "flow_coverage": self.get_coverage_percentage("flow"),
-            "gaps": gaps,
-        }
+        # Coverage stats only change when a test execution is recorded
+        if self._coverage_stats_cache[0] != self._version:
+            coverage_stats = {
+                "overall_coverage": self.get_coverage_percentage(),
+                "page_coverage": self.get_coverage_percentage("page"),
+                "flow_coverage": self.get_coverage_percentage("flow"),
+                "gaps": self.get_coverage_gaps(),
+            }
+            self._coverage_stats_cache = (
+                self._version,
+                orjson.dumps(coverage_stats, option=orjson.OPT_INDENT_2).decode(),
+            )
 
-        prompt = f"""
-        Analyze the test coverage for toyota.com and suggest missing test scenarios:
-
-        Current Coverage:
-        {json.dumps(coverage_stats, indent=2)}
-
-        {f"Focus Area: {focus_area}" if focus_area else ""}
-
-        Suggest 5-10 high-priority test scenarios that would improve coverage, considering:
-        1. Untested pages and features
-        2. Critical user journeys
-        3. Edge cases and error scenarios
-        4. Mobile and accessibility testing
-        5. Performance and visual regression
-
-        Return as JSON array:
-        [
-            {{
-                "test_name": "descriptive_test_name",
-                "priority": "critical|high|medium|low",
-                "description": "what this test validates",
-                "covers": ["page1", "flow1", "feature1"],
-                "type": "smoke|regression|visual|performance|accessibility",
-                "estimated_value": "why this test is important"
-            }}
-        ]
-        """
+        prompt = _SUGGEST_TESTS_PROMPT.substitute(
+            coverage_stats=self._coverage_stats_cache[1],
+            focus=f"Focus Area: {focus_area}" if focus_area else "",
+        )
 
         try:
-            if self.use_claude:
-                response = self.ai_client.messages.create(
-                    model=self.ai_model,
-                    max_tokens=2000,
-                    messages=[{"role": "user", "content": prompt}],
-                )
-                suggestions_text = response.content[0].text
-            else:
-                response = self.ai_client.chat.completions.create(
-                    model=self.ai_model,
-                    messages=[{"role": "user", "content": prompt}],
-                    max_tokens=2000,
-                )
-                suggestions_text = response.choices[0].message.content
-
+            suggestions_text = self._call_ai(prompt, max_tokens=2000)
             suggestions = self._extract_json(suggestions_text)
             return suggestions if isinstance(suggestions, list) else []
 
@@ -312,6 +371,33 @@ class CoverageAnalyzer:
             print(f"AI suggestion failed: {e}")
             return []
 
+    @cached_llm()
+    @AI_CIRCUIT_BREAKER
+    @retry_on_exception(
+        max_attempts=3,
+        delay=0.5,
+        exceptions=TRANSIENT_AI_ERRORS,
+        backoff=2,
+        max_delay=4,
+        jitter=True,
+    )
+    def _call_ai(self, prompt: str, max_tokens: int = 2000) -> str:
+        """Call AI API (responses are cached by model and prompt)"""
+        if self.use_claude:
+            response = self.ai_client.messages.create(
+                model=self.ai_model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            return response.content[0].text
+        else:
+            response = self.ai_client.chat.completions.create(
+                model=self.ai_model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+            )
+            return response.choices[0].message.content
+
     def generate_coverage_report(self, output_path: Optional[Path] = None) -> Path:
         """Generate comprehensive coverage report"""
         if output_path is None:
@@ -327,15 +413,15 @@ class CoverageAnalyzer:
                 "vehicle_coverage": self.get_coverage_percentage("vehicle"),
                 "flow_coverage": self.get_coverage_percentage("flow"),
                 "total_items": len(self.coverage_data),
-                "tested_items": sum(1 for item in self.coverage_data.values() if item.tested),
-                "total_test_executions": len(self.test_execution_history),
+                "tested_items": sum(stats["tested"] for stats in self._by_type.values()),
+                "total_test_executions": self._total_executions,
             },
             "coverage_by_type": self._get_coverage_by_type(),
             "gaps": self.get_coverage_gaps(),
             "detailed_coverage": {
-                key: asdict(item) for key, item in self.coverage_data.items()
+                key: item.to_dict() for key, item in self.coverage_data.items()
             },
-            "recent_test_executions": self.test_execution_history[-20:],  # Last 20
+            "recent_test_executions": list(self.test_execution_history)[-20:],  # Last 20
         }
 
         # Add AI suggestions if enabled
@@ -350,9 +436,7 @@ class CoverageAnalyzer:
             )
 
         # Save report
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        with open(output_path, "w") as f:
-            json.dump(report, f, indent=2)
+        write_bytes_atomic(orjson.dumps(report, option=orjson.OPT_INDENT_2), output_path)
 
         print(f"Coverage report generated: {output_path}")
         print(f"Overall Coverage: {report['summary']['overall_coverage']:.1f}%")
@@ -361,32 +445,25 @@ class CoverageAnalyzer:
 
     def _get_coverage_by_type(self) -> Dict[str, Dict]:
         """Get coverage statistics by type"""
-        by_type = defaultdict(lambda: {"total": 0, "tested": 0, "percentage": 0.0})
-
-        for item in self.coverage_data.values():
-            by_type[item.type]["total"] += 1
-            if item.tested:
-                by_type[item.type]["tested"] += 1
-
-        # Calculate percentages
-        for type_data in by_type.values():
-            if type_data["total"] > 0:
-                type_data["percentage"] = (type_data["tested"] / type_data["total"]) * 100
-
-        return dict(by_type)
+        return {
+            item_type: {
+                "total": stats["total"],
+                "tested": stats["tested"],
+                "percentage": (stats["tested"] / stats["total"]) * 100 if stats["total"] else 0.0,
+            }
+            for item_type, stats in self._by_type.items()
+        }
 
     def _extract_json(self, text: str) -> any:
         """Extract JSON from AI response"""
-        import re
-
-        json_match = re.search(r"```json\n(.*?)\n```", text, re.DOTALL)
+        json_match = _JSON_FENCE_RE.search(text)
         if json_match:
             try:
                 return json.loads(json_match.group(1))
             except json.JSONDecodeError:
                 pass
 
-        json_match = re.search(r"(\[.*\]|\{.*\})", text, re.DOTALL)
+        json_match = _JSON_RAW_RE.search(text)
         if json_match:
             try:
                 return json.loads(json_match.group(1))
@@ -395,31 +472,137 @@ class CoverageAnalyzer:
 
         return None
 
+    def _connect(self) -> sqlite3.Connection:
+        """Open the coverage database, creating its tables if needed"""
+        self.coverage_db_path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.coverage_db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS coverage ("
+            "key TEXT PRIMARY KEY, identifier TEXT, type TEXT, tested INTEGER, "
+            "test_count INTEGER, last_tested TEXT, test_files TEXT)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS history ("
+            "id INTEGER PRIMARY KEY, ts TEXT, test_name TEXT, test_file TEXT, "
+            "pages TEXT, features TEXT)"
+        )
+        return conn
+
     def _load_coverage_database(self):
         """Load coverage database from file"""
-        if self.coverage_db_path.exists():
-            try:
-                with open(self.coverage_db_path, "r") as f:
-                    data = json.load(f)
-                    # Reconstruct CoverageItem objects
-                    for key, item_data in data.get("coverage", {}).items():
-                        self.coverage_data[key] = CoverageItem(**item_data)
-                    self.test_execution_history = data.get("history", [])
-            except Exception as e:
-                print(f"Failed to load coverage database: {e}")
-
-    def _save_coverage_database(self):
-        """Save coverage database to file"""
-        self.coverage_db_path.parent.mkdir(parents=True, exist_ok=True)
+        import_legacy = (
+            not self.coverage_db_path.exists() and self.legacy_coverage_db_path.exists()
+        )
         try:
-            data = {
-                "coverage": {key: asdict(item) for key, item in self.coverage_data.items()},
-                "history": self.test_execution_history,
-                "last_updated": datetime.now().isoformat(),
-            }
-            with open(self.coverage_db_path, "w") as f:
-                json.dump(data, f, indent=2)
+            self._conn = self._connect()
+        except sqlite3.Error as e:
+            print(f"Failed to open coverage database: {e}")
+            self._conn = None
+            return
+
+        if import_legacy:
+            self._import_legacy_database()
+            return
+
+        try:
+            for key, identifier, item_type, tested, test_count, last_tested, test_files in (
+                self._conn.execute("SELECT * FROM coverage ORDER BY key")
+            ):
+                self._add_item(
+                    key,
+                    CoverageItem(
+                        identifier=identifier,
+                        type=item_type,
+                        tested=bool(tested),
+                        test_count=test_count,
+                        last_tested=last_tested,
+                        test_files=set(orjson.loads(test_files)),
+                    ),
+                )
+            self.test_execution_history.extend(
+                {
+                    "test_name": test_name,
+                    "test_file": test_file,
+                    "timestamp": ts,
+                    "pages_visited": orjson.loads(pages),
+                    "features_used": orjson.loads(features),
+                }
+                for ts, test_name, test_file, pages, features in self._conn.execute(
+                    "SELECT ts, test_name, test_file, pages, features FROM "
+                    "(SELECT * FROM history ORDER BY id DESC LIMIT ?) ORDER BY id",
+                    (_HISTORY_BUFFER_SIZE,),
+                )
+            )
+            (self._total_executions,) = self._conn.execute(
+                "SELECT COUNT(*) FROM history"
+            ).fetchone()
         except Exception as e:
+            print(f"Failed to load coverage database: {e}")
+
+    def _import_legacy_database(self):
+        """Import the JSON coverage database into SQLite"""
+        try:
+            data = orjson.loads(self.legacy_coverage_db_path.read_bytes())
+            for key, item_data in data.get("coverage", {}).items():
+                self._add_item(
+                    key, CoverageItem(**{**item_data, "test_files": set(item_data["test_files"])})
+                )
+                self._dirty.add(key)
+            history = data.get("history", [])
+            self.test_execution_history.extend(history)
+            self._total_executions = len(history)
+            self._save_coverage_database(history)
+        except Exception as e:
+            print(f"Failed to import coverage database: {e}")
+
+    @staticmethod
+    def _history_row(execution: Dict) -> tuple:
+        """History table row for a test execution"""
+        return (
+            execution["timestamp"],
+            execution["test_name"],
+            execution["test_file"],
+            orjson.dumps(execution["pages_visited"]).decode(),
+            orjson.dumps(execution["features_used"]).decode(),
+        )
+
+    def _coverage_row(self, key: str) -> tuple:
+        """Coverage table row for a coverage item"""
+        item = self.coverage_data[key]
+        return (
+            key,
+            item.identifier,
+            item.type,
+            int(item.tested),
+            item.test_count,
+            item.last_tested,
+            orjson.dumps(sorted(item.test_files)).decode(),
+        )
+
+    def _save_coverage_database(self, new_executions: Optional[List[Dict]] = None):
+        """
+        Save changed coverage items and new test executions in one transaction
+
+        Args:
+            new_executions: Test executions to append to the history table
+        """
+        if self._conn is None or not (self._dirty or new_executions):
+            return
+        try:
+            with self._conn:
+                if new_executions:
+                    self._conn.executemany(
+                        "INSERT INTO history (ts, test_name, test_file, pages, features) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [self._history_row(execution) for execution in new_executions],
+                    )
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO coverage VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [self._coverage_row(key) for key in self._dirty],
+                )
+            self._dirty.clear()
+        except sqlite3.Error as e:
             print(f"Failed to save coverage database: {e}")
 
 
@@ -0,0 +1,139 @@
+"""
+LLM Response Cache
+
+Caches AI responses in memory (LRU) and in a SQLite file so identical prompts
+are answered without an API call, within a run and across runs.
+"""
+import functools
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_CACHE_PATH = Path("test_data/ai_cache.sqlite")
+
+# One connection per database file, shared by all decorated methods
+_connections: Dict[Path, sqlite3.Connection] = {}
+# In-memory layers of all decorated methods, so clear_cache can empty them
+_memories: List["OrderedDict[str, Tuple[str, float]]"] = []
+_lock = threading.Lock()
+
+
+def _get_connection(path: Path) -> sqlite3.Connection:
+    """Open (once) the cache database at path"""
+    conn = _connections.get(path)
+    if conn is None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT, ts REAL)"
+        )
+        _connections[path] = conn
+    return conn
+
+
+def make_key(
+    model: str, prompt: str, max_tokens: Optional[int] = None, prefix: Optional[str] = None
+) -> str:
+    """Build a cache key from the model, prompt, static prompt prefix and response size"""
+    if prefix:
+        prompt = f"{prefix}|{prompt}"
+    return hashlib.sha256(f"{model}|{max_tokens}|{prompt}".encode()).hexdigest()
+
+
+def clear_cache(path: Path = DEFAULT_CACHE_PATH):
+    """Drop all cached responses, in memory and in the SQLite file at path"""
+    with _lock:
+        for memory in _memories:
+            memory.clear()
+        conn = _get_connection(path)
+        with conn:
+            conn.execute("DELETE FROM responses")
+
+
+def cached_llm(
+    maxsize: int = 512,
+    path: Path = DEFAULT_CACHE_PATH,
+    max_age: Optional[float] = None,
+    model_attr: str = "ai_model",
+) -> Callable:
+    """
+    Decorator caching an AI call method's responses
+
+    The decorated method must take (self, prompt, max_tokens=...) and return the
+    response text. A cached_prefix keyword argument, if passed, is part of the key.
+    Empty responses and exceptions are not cached, and instances with a false
+    use_cache attribute bypass the cache.
+
+    Args:
+        maxsize: Max responses kept in memory
+        path: SQLite file for the persistent cache
+        max_age: Seconds a cached response stays valid (None = forever)
+        model_attr: Instance attribute holding the model name
+
+    Returns:
+        Decorator
+    """
+
+    def decorator(func: Callable) -> Callable:
+        memory: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        _memories.append(memory)
+
+        def call(self, prompt: str, max_tokens: Optional[int], kwargs: Dict) -> str:
+            if max_tokens is None:
+                return func(self, prompt, **kwargs)
+            return func(self, prompt, max_tokens, **kwargs)
+
+        def fresh(ts: float) -> bool:
+            return max_age is None or time.time() - ts <= max_age
+
+        @functools.wraps(func)
+        def wrapper(self, prompt: str, max_tokens: Optional[int] = None, **kwargs) -> str:
+            if not getattr(self, "use_cache", True):
+                return call(self, prompt, max_tokens, kwargs)
+
+            key = make_key(
+                getattr(self, model_attr), prompt, max_tokens, kwargs.get("cached_prefix")
+            )
+
+            with _lock:
+                entry = memory.get(key)
+                if entry is not None and fresh(entry[1]):
+                    memory.move_to_end(key)
+                    return entry[0]
+                row = (
+                    _get_connection(path)
+                    .execute("SELECT response, ts FROM responses WHERE key = ?", (key,))
+                    .fetchone()
+                )
+                if row is not None and not fresh(row[1]):
+                    row = None
+
+            if row is not None:
+                response, ts = row
+            else:
+                response = call(self, prompt, max_tokens, kwargs)
+                if not response:
+                    return response
+                ts = time.time()
+
+            with _lock:
+                if row is None:
+                    conn = _get_connection(path)
+                    with conn:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?)",
+                            (key, response, ts),
+                        )
+                memory[key] = (response, ts)
+                if len(memory) > maxsize:
+                    memory.popitem(last=False)
+
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,22 @@
+"""
+AI Call Resilience
+
+Which provider errors the AI modules retry, and the circuit breaker they share.
+"""
+import anthropic
+import openai
+
+from src.core.utils.helpers import CircuitBreaker
+
+# Provider errors worth retrying (rate limits, overload, connection drops). After
+# repeated failures the shared breaker fails AI calls fast so callers fall back to
+# non-AI paths; other errors (auth, bad request) neither retry nor trip it.
+TRANSIENT_AI_ERRORS = (
+    anthropic.APIConnectionError,
+    anthropic.RateLimitError,
+    anthropic.InternalServerError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+AI_CIRCUIT_BREAKER = CircuitBreaker(fail_max=5, reset_timeout=60, exceptions=TRANSIENT_AI_ERRORS)
@@ -5,15 +5,142 @@ Automatically detects and fixes broken selectors using AI and multiple fallback
 """
 import json
 import re
+import time
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple
+from string import Template
+from typing import Any, Dict, List, Optional, Sequence, Tuple
 
+import orjson
 from anthropic import Anthropic
 from openai import OpenAI
 from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 
+from src.ai.llm_cache import cached_llm
+from src.ai.resilience import AI_CIRCUIT_BREAKER, TRANSIENT_AI_ERRORS
 from src.config.constants import SelectorStrategy
 from src.config.settings import settings
+from src.core.utils.helpers import retry_on_exception
+
+# Parsed selector databases by path, with the file mtime they were read at. Healers
+# in the same process share (and update) one dict until the file changes on disk.
+_SELECTOR_DB_CACHE: Dict[Path, Tuple[int, Dict[str, Any]]] = {}
+
+# Background AI requests, so heal strategies can keep probing the page meanwhile
+_AI_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="selector-ai")
+
+# Identifying parts of a selector: text= value, #id and .class
+_TEXT_EQ_RE = re.compile(r'text=["\']([^"\']+)["\']')
+_ID_HASH_RE = re.compile(r"#([\w-]+)")
+_CLASS_DOT_RE = re.compile(r"\.([\w-]+)")
+
+# Text content in text=, :has-text() and XPath contains(text(), ...) selectors
+_TEXT_PATTERNS = (
+    _TEXT_EQ_RE,
+    re.compile(r':has-text\(["\']([^"\']+)["\']\)'),
+    re.compile(r'contains\(text\(\),\s*["\']([^"\']+)["\']\)'),
+)
+
+# Leading outerHTML of the first element matching a hint (or of <body>), truncated
+_HTML_CONTEXT_JS = """({hints, size}) => {
+    let el = null;
+    for (const hint of hints) {
+        try {
+            el = document.querySelector(hint);
+        } catch (e) {
+            el = null;
+        }
+        if (el) {
+            break;
+        }
+    }
+    el = el || document.body || document.documentElement;
+    return el.outerHTML.slice(0, size);
+}"""
+
+# Last-resort position candidates and common ARIA landmarks, in probe order
+_POSITION_BASES = ("button", "a", "input", "div", "span")
+_POSITION_PSEUDOS = (":first-child", ":last-child", ":nth-child(1)", ":nth-child(2)")
+_POSITION_SELECTORS = tuple(
+    f"{base}{pseudo}" for base in _POSITION_BASES for pseudo in _POSITION_PSEUDOS
+)
+_POSITION_UNION = f":is({', '.join(_POSITION_BASES)}):is({', '.join(_POSITION_PSEUDOS)})"
+_ROLE_SELECTORS = tuple(
+    f'[role="{role}"]' for role in ("button", "link", "navigation", "main", "article", "search")
+)
+
+# Index of the first CSS selector matching exactly one visible element, or -1
+_FIRST_UNIQUE_VISIBLE_JS = """(selectors) => {
+    const isVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && getComputedStyle(el).visibility !== "hidden";
+    };
+    for (let i = 0; i < selectors.length; i++) {
+        let matches;
+        try {
+            matches = document.querySelectorAll(selectors[i]);
+        } catch (e) {
+            continue;
+        }
+        if (matches.length === 1 && isVisible(matches[0])) {
+            return i;
+        }
+    }
+    return -1;
+}"""
+
+# Prompt templates, built once
+_SUGGESTION_PROMPT = Template(
+    """The following selector failed to find an element:
+$selector
+
+Here's the relevant HTML context:
+```html
+$html_snippet
+```
+
+Suggest 5 alternative selectors that would be more resilient, prioritizing:
+1. Semantic HTML attributes (role, aria-label, etc.)
+2. Data attributes (data-testid, data-qa, etc.)
+3. Stable text content
+4. Specific element types with clear context
+
+Return only a JSON array of selector strings, no explanation:
+["selector1", "selector2", "selector3", "selector4", "selector5"]
+"""
+)
+
+_ROBUST_SELECTOR_PROMPT = Template(
+    """Generate robust Playwright selectors for the following element:
+$element_description
+
+Create 5 different selector strategies, prioritizing:
+1. ARIA roles and labels
+2. Data attributes (data-testid)
+3. Semantic HTML
+4. Stable text content
+5. CSS classes (as last resort)
+
+Return as JSON array of objects:
+[
+    {"selector": "selector string", "strategy": "strategy name", "reliability": "high|medium|low"}
+]
+"""
+)
+
+# Outermost JSON array or object in an AI response
+_JSON_RAW_RE = re.compile(r"(\[.*\]|\{.*\})", re.DOTALL)
+
+
+def _classify_selector(selector: str) -> Dict[str, bool]:
+    """Which identifying parts (text, id, class) a selector contains"""
+    return {
+        "has_text": any(pattern.search(selector) for pattern in _TEXT_PATTERNS),
+        "has_id": bool(_ID_HASH_RE.search(selector)),
+        "has_class": bool(_CLASS_DOT_RE.search(selector)),
+    }
 
 
 class SelectorHealer:
@@ -31,6 +158,8 @@ class SelectorHealer:
         self.use_claude = use_claude
         self.selector_history: Dict[str, List[str]] = {}
         self.selector_db_path = Path("test_data/selectors.json")
+        # HTML context snippets, cached only inside _html_cache_scope
+        self._html_cache: Optional[Dict[Tuple[Tuple[str, ...], int], str]] = None
 
         # Initialize AI client
         if use_claude and settings.anthropic_api_key:
@@ -54,7 +183,9 @@ class SelectorHealer:
         Args:
             selector: CSS selector or locator string
             timeout: Timeout in milliseconds
-            auto_heal: Automatically attempt to heal if selector fails
+            auto_heal: Automatically attempt to heal if selector fails (healing probes
+                candidates with short timeouts; the healed selector then gets the
+                full timeout)
 
         Returns:
             Element locator or None
@@ -83,49 +214,75 @@ class SelectorHealer:
 
             raise
 
-    def heal_selector(self, failed_selector: str, timeout: int = 5000) -> Optional[str]:
+    def heal_selector(
+        self,
+        failed_selector: str,
+        timeout: int = 5000,
+        probe_timeout: Optional[int] = 500,
+        prefetch_ai: bool = False,
+    ) -> Optional[str]:
         """
         Attempt to heal a failed selector using multiple strategies
 
+        Candidates only need to be confirmed present, so each strategy waits at most
+        probe_timeout; callers should re-validate the winner with their full timeout.
+
         Args:
             failed_selector: The selector that failed
-            timeout: Timeout for each attempt
+            timeout: Timeout for each attempt when probe_timeout is None
+            probe_timeout: Shorter timeout used for each strategy's probe
+            prefetch_ai: Once the selector history misses, start the AI request in the
+                background so its latency overlaps the semantic strategy (the request is
+                paid for even if that strategy heals the selector)
 
         Returns:
             Working selector or None
         """
-        strategies = [
-            self._try_fallback_selectors,
-            self._try_semantic_selectors,
-            self._try_ai_suggested_selectors,
-            self._try_fuzzy_text_match,
-            self._try_position_based,
-        ]
-
-        for strategy in strategies:
-            healed_selector = strategy(failed_selector, timeout)
-            if healed_selector:
-                return healed_selector
+        if probe_timeout is not None:
+            timeout = min(timeout, probe_timeout)
+
+        # Known fallbacks first; they need neither the AI nor the page HTML
+        healed_selector = self._try_fallback_selectors(failed_selector, timeout)
+        if healed_selector:
+            return healed_selector
+
+        # Strategies share one HTML context lookup per heal
+        with self._html_cache_scope():
+            # Only run the strategies that can produce something new for this selector
+            kind = _classify_selector(failed_selector)
+            strategies = []
+            if kind["has_text"] or kind["has_class"]:
+                strategies.append(self._try_semantic_selectors)
+            if self.ai_client:
+                suggestions = self._start_ai_suggestions(failed_selector) if prefetch_ai else None
+                strategies.append(
+                    partial(self._try_ai_suggested_selectors, suggestions=suggestions)
+                )
+            if kind["has_text"]:
+                strategies.append(self._try_fuzzy_text_match)
+            if not kind["has_id"]:
+                # Position guesses are meaningless as a stand-in for a specific id
+                strategies.append(self._try_position_based)
+
+            for strategy in strategies:
+                healed_selector = strategy(failed_selector, timeout)
+                if healed_selector:
+                    return healed_selector
 
-        return None
+            return None
 
     def _try_fallback_selectors(self, selector: str, timeout: int) -> Optional[str]:
         """Try known fallback selectors from history"""
         if selector in self.selector_history:
-            for fallback in self.selector_history[selector]:
-                try:
-                    self.page.locator(fallback).wait_for(timeout=timeout)
-                    return fallback
-                except PlaywrightTimeoutError:
-                    continue
+            return self._test_selectors(self.selector_history[selector], timeout)
         return None
 
     def _try_semantic_selectors(self, selector: str, timeout: int) -> Optional[str]:
         """Try semantic HTML and ARIA-based selectors"""
         # Extract text content or identifying information
-        text_match = re.search(r'text=["\']([^"\']+)["\']', selector)
-        id_match = re.search(r'#([\w-]+)', selector)
-        class_match = re.search(r'\.([\w-]+)', selector)
+        text_match = _TEXT_EQ_RE.search(selector)
+        id_match = _ID_HASH_RE.search(selector)
+        class_match = _CLASS_DOT_RE.search(selector)
 
         alternatives = []
 
@@ -156,63 +313,166 @@ class SelectorHealer:
                 ]
             )
 
-        # Try ARIA roles
-        common_roles = ["button", "link", "navigation", "main", "article", "search"]
-        for role in common_roles:
-            alternatives.append(f'[role="{role}"]')
+        if alternatives:
+            healed = self._test_selectors(alternatives, timeout)
+            if healed:
+                return healed
 
-        return self._test_selectors(alternatives, timeout)
+        # Try ARIA roles, all checked in one page evaluation
+        return self._first_unique_visible(_ROLE_SELECTORS)
+
+    def _try_ai_suggested_selectors(
+        self, selector: str, timeout: int, suggestions: Optional[Future] = None
+    ) -> Optional[str]:
+        """
+        Use AI to suggest alternative selectors
 
-    def _try_ai_suggested_selectors(self, selector: str, timeout: int) -> Optional[str]:
-        """Use AI to suggest alternative selectors"""
+        Args:
+            selector: The selector that failed
+            timeout: Timeout for testing the suggestions
+            suggestions: Pending AI response from _start_ai_suggestions (started here if omitted)
+        """
         if not self.ai_client:
             return None
 
         try:
-            # Get page HTML context
-            html_snippet = self._get_html_context(selector)
+            if suggestions is None:
+                suggestions = self._start_ai_suggestions(selector)
+            response = suggestions.result()
+            parsed = self._extract_json(response)
 
-            prompt = f"""
-            The following selector failed to find an element:
-            {selector}
+            if isinstance(parsed, list):
+                return self._test_selectors(parsed, timeout)
 
-            Here's the relevant HTML context:
-            ```html
-            {html_snippet}
-            ```
+        except Exception as e:
+            print(f"AI selector suggestion failed: {e}")
 
-            Suggest 5 alternative selectors that would be more resilient, prioritizing:
-            1. Semantic HTML attributes (role, aria-label, etc.)
-            2. Data attributes (data-testid, data-qa, etc.)
-            3. Stable text content
-            4. Specific element types with clear context
+        return None
 
-            Return only a JSON array of selector strings, no explanation:
-            ["selector1", "selector2", "selector3", "selector4", "selector5"]
-            """
+    def _start_ai_suggestions(self, selector: str) -> Future:
+        """Request AI alternatives for a failed selector in the background"""
+        # The page is only touched here, on the calling thread; the worker just calls the API
+        prompt = self._build_suggestion_prompt(selector, self._get_html_context(selector))
+        return _AI_EXECUTOR.submit(self._call_ai, prompt, 500)
+
+    def heal_selectors_batch(
+        self,
+        failed_selectors: List[str],
+        timeout: int = 5000,
+        poll_interval: float = 10.0,
+        batch_timeout: float = 300.0,
+    ) -> Dict[str, Optional[str]]:
+        """
+        Heal several failed selectors with one batched round of AI suggestions
 
-            response = self._call_ai(prompt, max_tokens=500)
-            suggestions = self._extract_json(response)
+        With Claude the prompts go through the Message Batches API (billed at a
+        discount, but results may take minutes to arrive). Prompts the batch does not
+        answer within batch_timeout, and all prompts with OpenAI, are sent
+        concurrently through _call_ai instead. Healed selectors are saved to the
+        selector database.
 
-            if isinstance(suggestions, list):
-                return self._test_selectors(suggestions, timeout)
+        Args:
+            failed_selectors: Selectors that failed
+            timeout: Timeout for testing each suggestion
+            poll_interval: Seconds between batch status checks
+            batch_timeout: Seconds to wait for the batch before falling back
 
-        except Exception as e:
-            print(f"AI selector suggestion failed: {e}")
+        Returns:
+            Mapping of each failed selector to its healed selector, or None
+        """
+        selectors = list(dict.fromkeys(failed_selectors))
+        if not self.ai_client or not selectors:
+            return {selector: None for selector in selectors}
+
+        with self._html_cache_scope():
+            prompts = [
+                self._build_suggestion_prompt(selector, self._get_html_context(selector))
+                for selector in selectors
+            ]
+
+        responses: List[Optional[str]] = [None] * len(prompts)
+        if self.use_claude and hasattr(self.ai_client.messages, "batches"):
+            try:
+                responses = self._batch_suggestions(prompts, poll_interval, batch_timeout)
+            except Exception as e:
+                print(f"AI selector batch failed, requesting suggestions directly: {e}")
 
-        return None
+        missing = [i for i, response in enumerate(responses) if response is None]
+        futures = {i: _AI_EXECUTOR.submit(self._call_ai, prompts[i], 500) for i in missing}
+        for i, future in futures.items():
+            try:
+                responses[i] = future.result()
+            except Exception as e:
+                print(f"AI selector suggestion failed: {e}")
+
+        healed: Dict[str, Optional[str]] = {}
+        for selector, response in zip(selectors, responses):
+            suggestions = self._extract_json(response) if response else None
+            healed[selector] = (
+                self._test_selectors(suggestions, timeout)
+                if isinstance(suggestions, list)
+                else None
+            )
+            if healed[selector]:
+                self._save_healed_selector(selector, healed[selector])
+
+        return healed
+
+    def _batch_suggestions(
+        self, prompts: List[str], poll_interval: float, timeout: float
+    ) -> List[Optional[str]]:
+        """
+        Send suggestion prompts through the Claude Message Batches API
+
+        Args:
+            prompts: Suggestion prompts
+            poll_interval: Seconds between batch status checks
+            timeout: Seconds to wait before cancelling the batch
+
+        Returns:
+            Response per prompt, in order (None for requests that did not succeed)
+
+        Raises:
+            TimeoutError: If the batch has not ended within timeout
+        """
+        batches = self.ai_client.messages.batches
+        batch = batches.create(
+            requests=[
+                {
+                    "custom_id": f"selector-{i}",
+                    "params": {
+                        "model": self.ai_model,
+                        "max_tokens": 500,
+                        "messages": [{"role": "user", "content": prompt}],
+                    },
+                }
+                for i, prompt in enumerate(prompts)
+            ]
+        )
+        deadline = time.monotonic() + timeout
+        while batch.processing_status != "ended":
+            if time.monotonic() >= deadline:
+                batches.cancel(batch.id)
+                raise TimeoutError(f"batch {batch.id} did not end within {timeout:.0f}s")
+            time.sleep(poll_interval)
+            batch = batches.retrieve(batch.id)
+
+        responses: List[Optional[str]] = [None] * len(prompts)
+        for entry in batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                index = int(entry.custom_id.rsplit("-", 1)[1])
+                responses[index] = entry.result.message.content[0].text
+        return responses
+
+    def _build_suggestion_prompt(self, selector: str, html_snippet: str) -> str:
+        """Build the prompt asking for alternatives to a failed selector"""
+        return _SUGGESTION_PROMPT.substitute(selector=selector, html_snippet=html_snippet)
 
     def _try_fuzzy_text_match(self, selector: str, timeout: int) -> Optional[str]:
         """Try fuzzy text matching"""
         # Extract potential text content
-        text_patterns = [
-            r'text=["\']([^"\']+)["\']',
-            r':has-text\(["\']([^"\']+)["\']\)',
-            r'contains\(text\(\),\s*["\']([^"\']+)["\']\)',
-        ]
-
-        for pattern in text_patterns:
-            match = re.search(pattern, selector)
+        for pattern in _TEXT_PATTERNS:
+            match = pattern.search(selector)
             if match:
                 text = match.group(1)
                 # Try partial text match
@@ -229,45 +489,119 @@ class SelectorHealer:
 
     def _try_position_based(self, selector: str, timeout: int) -> Optional[str]:
         """Try position-based selectors as last resort"""
-        # This is least stable but sometimes necessary
-        base_selectors = ["button", "a", "input", "div", "span"]
+        # This is least stable but sometimes necessary. One wait on the union of
+        # all candidates, then one evaluation to pick the first unique match
+        try:
+            self.page.locator(f"{_POSITION_UNION} >> visible=true").first.wait_for(timeout=timeout)
+        except Exception:
+            return None
 
-        alternatives = []
-        for base in base_selectors:
-            alternatives.extend(
-                [
-                    f"{base}:first-child",
-                    f"{base}:last-child",
-                    f"{base}:nth-child(1)",
-                    f"{base}:nth-child(2)",
-                ]
-            )
+        return self._first_unique_visible(_POSITION_SELECTORS)
 
-        return self._test_selectors(alternatives, timeout)
+    def _first_unique_visible(self, selectors: Sequence[str]) -> Optional[str]:
+        """
+        Return the first CSS selector matching exactly one visible element
+
+        Checks every candidate in a single page evaluation instead of a count and
+        visibility round trip per selector.
+
+        Args:
+            selectors: CSS selectors, in order of preference
+
+        Returns:
+            Matching selector or None
+        """
+        try:
+            index = self.page.evaluate(_FIRST_UNIQUE_VISIBLE_JS, list(selectors))
+        except Exception:
+            return None
+        return selectors[index] if index >= 0 else None
 
     def _test_selectors(self, selectors: List[str], timeout: int) -> Optional[str]:
-        """Test a list of selectors and return first working one"""
+        """
+        Test a list of selectors and return the first working one
+
+        All candidates are waited on together, so a probe costs at most one timeout
+        instead of one per selector. A selector works if it matches exactly one
+        visible element.
+        """
+        candidates = []
         for sel in selectors:
             try:
-                self.page.locator(sel).wait_for(timeout=timeout)
-                return sel
-            except (PlaywrightTimeoutError, Exception):
+                locator = self.page.locator(sel)
+                locator.count()  # Raises on invalid selector syntax
+            except Exception:
+                continue
+            candidates.append((sel, locator))
+
+        if not candidates:
+            return None
+
+        any_visible = self.page.locator(f"{candidates[0][0]} >> visible=true")
+        for sel, _ in candidates[1:]:
+            any_visible = any_visible.or_(self.page.locator(f"{sel} >> visible=true"))
+
+        try:
+            any_visible.first.wait_for(timeout=timeout)
+        except Exception:
+            return None
+
+        for sel, locator in candidates:
+            try:
+                if locator.count() == 1 and locator.is_visible():
+                    return sel
+            except Exception:
                 continue
         return None
 
     def _get_html_context(self, selector: str, context_size: int = 500) -> str:
         """Get HTML context around the failed selector"""
-        try:
-            # Get page HTML
-            html = self.page.content()
+        # Look near an element sharing the selector's id or class, else the page body
+        hints = []
+        id_match = _ID_HASH_RE.search(selector)
+        if id_match:
+            hints.append(f'[id="{id_match.group(1)}"]')
+        class_match = _CLASS_DOT_RE.search(selector)
+        if class_match:
+            hints.append(f'[class~="{class_match.group(1)}"]')
 
-            # Try to find similar elements or context
-            # This is simplified - in production, you'd want more sophisticated parsing
-            return html[:context_size] if len(html) > context_size else html
+        cache_key = (tuple(hints), context_size)
+        if self._html_cache is not None and cache_key in self._html_cache:
+            return self._html_cache[cache_key]
 
+        try:
+            # Only the snippet crosses the wire, not the whole page HTML
+            html = self.page.evaluate(_HTML_CONTEXT_JS, {"hints": hints, "size": context_size})
         except Exception:
             return ""
 
+        if self._html_cache is not None:
+            self._html_cache[cache_key] = html
+        return html
+
+    @contextmanager
+    def _html_cache_scope(self):
+        """Reuse HTML context snippets for the duration of one heal call"""
+        if self._html_cache is not None:
+            # Nested scope: keep using the outer cache
+            yield
+            return
+        self._html_cache = {}
+        try:
+            yield
+        finally:
+            self._html_cache = None
+
+    @cached_llm()
+    @AI_CIRCUIT_BREAKER
+    @retry_on_exception(
+        max_attempts=3,
+        delay=0.5,
+        exceptions=TRANSIENT_AI_ERRORS,
+        backoff=2,
+        max_delay=4,
+        jitter=True,
+    )
     def _call_ai(self, prompt: str, max_tokens: int = 1000) -> str:
         """Call AI API"""
         if self.use_claude:
@@ -285,7 +619,7 @@ class SelectorHealer:
 
     def _extract_json(self, text: str) -> Any:
         """Extract JSON from AI response"""
-        json_match = re.search(r"(\[.*\]|\{.*\})", text, re.DOTALL)
+        json_match = _JSON_RAW_RE.search(text)
         if json_match:
             try:
                 return json.loads(json_match.group(1))
@@ -309,15 +643,23 @@ class SelectorHealer:
         self._save_selector_database()
 
     def _load_selector_database(self):
-        """Load selector database from file"""
-        if self.selector_db_path.exists():
-            try:
-                with open(self.selector_db_path, "r") as f:
-                    self.selector_history = json.load(f)
-            except Exception as e:
-                print(f"Failed to load selector database: {e}")
-                self.selector_history = {}
-        else:
+        """Load selector database from file (shared in-process while the file is unchanged)"""
+        try:
+            mtime = self.selector_db_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self.selector_history = {}
+            return
+
+        cached = _SELECTOR_DB_CACHE.get(self.selector_db_path)
+        if cached is not None and cached[0] == mtime:
+            self.selector_history = cached[1]
+            return
+
+        try:
+            self.selector_history = orjson.loads(self.selector_db_path.read_bytes())
+            _SELECTOR_DB_CACHE[self.selector_db_path] = (mtime, self.selector_history)
+        except Exception as e:
+            print(f"Failed to load selector database: {e}")
             self.selector_history = {}
 
     def _save_selector_database(self):
@@ -326,6 +668,10 @@ class SelectorHealer:
         try:
             with open(self.selector_db_path, "w") as f:
                 json.dump(self.selector_history, f, indent=2)
+            _SELECTOR_DB_CACHE[self.selector_db_path] = (
+                self.selector_db_path.stat().st_mtime_ns,
+                self.selector_history,
+            )
         except Exception as e:
             print(f"Failed to save selector database: {e}")
 
@@ -342,22 +688,7 @@ class SelectorHealer:
         if not self.ai_client:
             return []
 
-        prompt = f"""
-        Generate robust Playwright selectors for the following element:
-        {element_description}
-
-        Create 5 different selector strategies, prioritizing:
-        1. ARIA roles and labels
-        2. Data attributes (data-testid)
-        3. Semantic HTML
-        4. Stable text content
-        5. CSS classes (as last resort)
-
-        Return as JSON array of objects:
-        [
-            {{"selector": "selector string", "strategy": "strategy name", "reliability": "high|medium|low"}}
-        ]
-        """
+        prompt = _ROBUST_SELECTOR_PROMPT.substitute(element_description=element_description)
 
         response = self._call_ai(prompt)
         suggestions = self._extract_json(response)
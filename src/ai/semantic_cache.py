@@ -0,0 +1,145 @@
+"""
+Semantic Response Cache
+
+Answers prompts that are worded differently but mean the same thing
+("login flow" vs "user login") from a cached response. Prompts are embedded,
+and a cached response is reused when its prompt's cosine similarity reaches
+the threshold. Entries persist in the same SQLite file as the exact-match cache.
+"""
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.ai.llm_cache import DEFAULT_CACHE_PATH
+
+_CREATE_TABLE_SQL = (
+    "CREATE TABLE IF NOT EXISTS semantic_responses "
+    "(id INTEGER PRIMARY KEY, namespace TEXT, embedding BLOB, response TEXT, ts REAL)"
+)
+
+
+def clear_semantic_cache(path: Path = DEFAULT_CACHE_PATH):
+    """Drop all persistent semantic cache entries in the SQLite file at path"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(_CREATE_TABLE_SQL)
+        conn.execute("DELETE FROM semantic_responses")
+
+
+class SemanticCache:
+    """Embedding-similarity cache of AI responses, partitioned by namespace"""
+
+    def __init__(
+        self,
+        embed: Callable[[str], Sequence[float]],
+        threshold: float = 0.92,
+        path: Path = DEFAULT_CACHE_PATH,
+        max_age: Optional[float] = None,
+    ):
+        """
+        Initialize the semantic cache
+
+        Args:
+            embed: Function returning the embedding vector of a text
+            threshold: Minimum cosine similarity for a cache hit
+            path: SQLite file for the persistent entries
+            max_age: Seconds an entry stays valid (None = forever)
+        """
+        self.embed = embed
+        self.threshold = threshold
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        # namespace -> (unit-length embeddings as rows, store times, responses in row order)
+        self._index: Dict[str, Tuple[np.ndarray, np.ndarray, List[str]]] = {}
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(_CREATE_TABLE_SQL)
+
+    def lookup(self, namespace: str, text: str) -> Tuple[Optional[str], np.ndarray]:
+        """
+        Find the cached response for the most similar prompt
+
+        Args:
+            namespace: Partition to search (e.g. model and prompt kind)
+            text: Prompt text
+
+        Returns:
+            (response or None on a miss, embedding of text to pass to store)
+        """
+        vector = np.asarray(self.embed(text), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector = vector / norm
+
+        with self._lock:
+            matrix, stored_at, responses = self._load(namespace)
+            if not responses or matrix.shape[1] != vector.shape[0]:
+                return None, vector
+            scores = matrix @ vector
+            if self.max_age is not None:
+                scores[stored_at < time.time() - self.max_age] = -np.inf
+            best = int(np.argmax(scores))
+            if scores[best] >= self.threshold:
+                return responses[best], vector
+        return None, vector
+
+    def store(self, namespace: str, vector: np.ndarray, response: str):
+        """
+        Add a response under the embedding returned by lookup
+
+        Args:
+            namespace: Partition the prompt belongs to
+            vector: Embedding returned by lookup
+            response: Response text to cache
+        """
+        with self._lock:
+            matrix, stored_at, responses = self._load(namespace)
+            if responses and matrix.shape[1] != vector.shape[0]:
+                return  # Embedding model changed; keep the existing entries consistent
+            ts = time.time()
+            self._index[namespace] = (
+                np.vstack([matrix, vector]) if responses else vector[np.newaxis, :],
+                np.append(stored_at, ts),
+                responses + [response],
+            )
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO semantic_responses (namespace, embedding, response, ts) "
+                    "VALUES (?, ?, ?, ?)",
+                    (namespace, vector.tobytes(), response, ts),
+                )
+
+    def clear(self):
+        """Drop all entries, in memory and on disk"""
+        with self._lock:
+            self._index.clear()
+            with self._conn:
+                self._conn.execute("DELETE FROM semantic_responses")
+
+    def _load(self, namespace: str) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+        """Return the namespace's index, reading it from disk on first use"""
+        entry = self._index.get(namespace)
+        if entry is None:
+            rows = self._conn.execute(
+                "SELECT embedding, ts, response FROM semantic_responses WHERE namespace = ? "
+                "ORDER BY id",
+                (namespace,),
+            ).fetchall()
+            vectors = [np.frombuffer(blob, dtype=np.float32) for blob, _, _ in rows]
+            if vectors and len({v.shape[0] for v in vectors}) == 1:
+                entry = (
+                    np.vstack(vectors),
+                    np.array([ts for _, ts, _ in rows], dtype=np.float64),
+                    [response for _, _, response in rows],
+                )
+            else:
+                entry = (np.empty((0, 0), dtype=np.float32), np.empty(0), [])
+            self._index[namespace] = entry
+        return entry
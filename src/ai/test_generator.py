@@ -9,16 +9,25 @@ Enhanced with MCP integration for:
 - Combining interactive recording with AI-generated assertions
 - Integrating with selector discovery and self-healing
 """
-import json
 import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Tuple
 
-from anthropic import Anthropic
-from openai import OpenAI
+import orjson
 
+from src.ai.llm_cache import cached_llm, clear_cache, make_key
+from src.ai.semantic_cache import SemanticCache, clear_semantic_cache
 from src.config.constants import AI_PROMPTS, ToyotaPages
 from src.config.settings import settings
+from src.core.utils.helpers import parse_embedded_json
+
+# The AI SDKs are imported when a client is first created, so only the one in use is loaded
+if TYPE_CHECKING:
+    from anthropic import Anthropic
+    from openai import OpenAI
 
 # MCP integration imports (optional, lazy loaded)
 try:
@@ -28,35 +37,319 @@ try:
 except ImportError:
     MCP_AVAILABLE = False
 
+# Cached responses older than this are regenerated
+_RESPONSE_CACHE_MAX_AGE = 24 * 60 * 60
+
+# Max AI requests in flight when generating several tests at once
+_MAX_CONCURRENT_CALLS = 8
+
+# Response token budget per kind of request, sized to the expected output
+_MAX_TOKENS = {
+    "scenarios": 2048,
+    "assertions": 1500,
+    "test": 4096,
+    "enhance": 6000,
+    "suite": 8192,  # Several sessions' tests in one response; the usual output cap
+}
+
+# Context window (prompt + response tokens) per provider
+_CONTEXT_WINDOW_TOKENS = {"claude": 200_000, "openai": 128_000}
+
+# Anthropic ignores cache_control on prefixes shorter than this (Sonnet's minimum)
+_MIN_CACHEABLE_PREFIX_TOKENS = 1024
+
+
+@lru_cache(maxsize=4)
+def _anthropic_client(api_key: str) -> "Anthropic":
+    """Shared Anthropic client per API key, so generators reuse its connection pool"""
+    from anthropic import Anthropic
+
+    return Anthropic(api_key=api_key)
+
+
+@lru_cache(maxsize=4)
+def _openai_client(api_key: str) -> "OpenAI":
+    """Shared OpenAI client per API key, so generators reuse its connection pool"""
+    from openai import OpenAI
+
+    return OpenAI(api_key=api_key)
+
+
+def _test_file_name(page: str) -> str:
+    """Test file name for a page path, e.g. /vehicles -> test_vehicles.py"""
+    return f"test_{page.replace('/', '_').strip('_')}.py"
+
+
+# Test file names of the known site pages, built once
+_PAGE_TEST_FILES = {page.value: _test_file_name(page.value) for page in ToyotaPages}
+
+# Pages whose tests are generated with --critical-only
+_CRITICAL_PAGES = frozenset(
+    {
+        ToyotaPages.HOMEPAGE.value,
+        ToyotaPages.VEHICLES.value,
+        ToyotaPages.BUILD_AND_PRICE.value,
+        ToyotaPages.DEALERS.value,
+    }
+)
+
+# Prompt line per recorded action type; other types use _ACTION_FORMAT_DEFAULT
+_ACTION_FORMATS = {
+    "navigate": "{i}. Navigate to: {url}",
+    "click": "{i}. Click: {selector}",
+    "fill": "{i}. Fill '{selector}' with: {value}",
+    "select": "{i}. Select '{value}' in: {selector}",
+}
+_ACTION_FORMAT_DEFAULT = "{i}. {type}: {selector}"
+
+# Code fences and test function names in generated code
+_CODE_FENCE_RE = re.compile(r"```(?:python\n|\n)?")
+_TEST_DEF_RE = re.compile(r"def test_\w+")
+
+# JSON in a ```json fenced block of an AI response
+_JSON_FENCE_RE = re.compile(r"```json\n(.*?)\n```", re.DOTALL)
+
+# Static prompt instructions. They are sent before the per-call details and are
+# part of the response cache key, so they must stay plain strings (no
+# interpolation) to be byte-identical across calls. They are currently below
+# Anthropic's minimum cacheable length, so they are not marked for prompt caching.
+_TEST_GENERATION_INSTRUCTIONS = """
+Generate a comprehensive Playwright Python test for toyota.com.
+
+Generate a pytest test that:
+1. Uses page object pattern for selectors
+2. Includes proper assertions
+3. Handles waits and timeouts appropriately
+4. Includes accessibility checks
+5. Has clear test documentation
+6. Uses fixtures for setup/teardown
+7. Includes visual regression checkpoints if appropriate
+8. Validates performance metrics
+
+Return ONLY valid Python code with no explanations.
+Use this structure:
+
+```python
+import pytest
+from playwright.sync_api import Page, expect
+from src.core.page_objects.base_page import BasePage
+
+@pytest.mark.smoke
+def test_feature_name(page: Page):
+    '''Test description'''
+    # Test implementation
+    pass
+```
+
+The page, user flow and requirements to test follow.
+"""
+
+_TEST_SCENARIOS_INSTRUCTIONS = """
+Suggest comprehensive test scenarios for a feature on toyota.com.
+
+Provide test scenarios covering:
+1. Happy path
+2. Edge cases
+3. Error handling
+4. Accessibility
+5. Performance
+6. Mobile responsiveness
+
+Return as JSON array with this structure:
+[
+    {
+        "name": "Test scenario name",
+        "description": "What this test validates",
+        "priority": "critical|high|medium|low",
+        "type": "smoke|regression|visual|performance",
+        "steps": ["Step 1", "Step 2", ...]
+    }
+]
+
+The feature follows.
+"""
+
+_MCP_ENHANCE_INSTRUCTIONS = """
+Enhance a Playwright test that was recorded via MCP codegen.
+
+IMPORTANT:
+- Preserve all the original actions and selectors
+- Add assertions after key actions to validate state
+- Use expect() assertions from playwright.sync_api
+- Add comments explaining what each assertion validates
+- Integrate self-healing selectors from src.ai.self_healing
+- Add visual regression checks if appropriate
+- Include performance checks for page load and interactions
+
+Return ONLY the enhanced Python code with proper pytest format.
+
+Please enhance this test with:
+"""
+
+_MCP_ACTIONS_INSTRUCTIONS = """
+Generate a comprehensive Playwright pytest test from recorded actions.
+
+Generate a complete pytest test that:
+1. Implements all the recorded actions
+2. Adds meaningful assertions after each major action
+3. Uses self-healing selectors from src.ai.self_healing
+4. Includes error handling
+5. Adds visual regression checks at key points
+6. Validates page state and transitions
+7. Includes accessibility checks
+8. Uses proper pytest fixtures and markers
+
+Structure (use the given test name as the function name and the flow
+description as its docstring):
+```python
+import pytest
+from playwright.sync_api import Page, expect
+from src.ai.self_healing import SelfHealingSelector
+from src.ai.visual_ai import VisualAI
+
+@pytest.mark.mcp_generated
+@pytest.mark.smoke  # or appropriate marker
+def test_name(page: Page):
+    '''
+    Flow description
+    '''
+    # Test implementation with all actions and assertions
+```
+
+Return ONLY valid Python code.
+
+The test name, flow description and recorded actions follow.
+"""
+
+_MCP_SUITE_INSTRUCTIONS = """
+Generate comprehensive Playwright pytest tests from several recorded sessions,
+one independent test per session.
+
+Each test must:
+1. Implement all the session's recorded actions
+2. Add meaningful assertions after each major action
+3. Use self-healing selectors from src.ai.self_healing
+4. Include error handling
+5. Add visual regression checks at key points
+6. Validate page state and transitions
+7. Include accessibility checks
+8. Use proper pytest fixtures and markers, including @pytest.mark.mcp_generated
+
+Each test is a complete module with its own imports (pytest, Page and expect from
+playwright.sync_api, SelfHealingSelector, VisualAI), using the session's test name
+as the function name and its flow description as the docstring.
+
+Return ONLY a JSON object mapping each test name to its Python code:
+{"test_name": "import pytest\\n..."}
+
+The sessions follow.
+"""
+
+_ASSERTION_SUGGESTION_INSTRUCTIONS = """
+Suggest meaningful assertions to validate the application state after recorded
+user actions.
+
+Suggest assertions that:
+1. Verify page transitions completed successfully
+2. Check that elements are visible/clickable after interactions
+3. Validate form submissions
+4. Check URL changes
+5. Verify content updates
+
+Return as JSON array:
+[
+    {
+        "after_action": "Action number (0-based index)",
+        "assertion_type": "expect_visible|expect_url|expect_text|expect_count",
+        "selector": "CSS selector to check",
+        "description": "What this assertion validates",
+        "code": "expect(page.locator('...')).to_be_visible()"
+    }
+]
+
+The page URL and recorded actions follow.
+"""
+
+# Enhancement requirement lists for enhance_mcp_recording, by level
+_ENHANCEMENT_REQUIREMENTS = {
+    "minimal": """
+- Add basic expect() assertions after navigation and clicks
+- Validate page loaded successfully
+- Use self-healing selectors
+""",
+    "moderate": """
+- Add comprehensive expect() assertions after all interactions
+- Validate page state and element visibility
+- Use self-healing selectors with fallbacks
+- Add basic visual regression checks at key points
+- Include accessibility checks for interactive elements
+""",
+    "full": """
+- Add comprehensive expect() assertions for all actions
+- Validate page state, URL, content, and element states
+- Use self-healing selectors with multiple fallback strategies
+- Add visual regression checks at all major UI states
+- Include comprehensive accessibility checks
+- Add performance validations for page load and interactions
+- Include anomaly detection for console errors
+- Add data-driven test variations if applicable
+""",
+}
+
+# Full enhance_mcp_recording prefix per level, built once so each level's bytes are stable
+_MCP_ENHANCE_PREFIXES = {
+    level: _MCP_ENHANCE_INSTRUCTIONS + requirements
+    for level, requirements in _ENHANCEMENT_REQUIREMENTS.items()
+}
+
 
 class AITestGenerator:
     """Generate test cases using AI models"""
 
-    def __init__(self, use_claude: bool = True):
+    def __init__(
+        self, use_claude: bool = True, cache: bool = True, use_semantic_cache: bool = False
+    ):
         """
         Initialize the AI test generator
 
         Args:
             use_claude: If True, use Claude; otherwise use OpenAI GPT
+            cache: Reuse cached responses for identical prompts
+            use_semantic_cache: Reuse scenario and assertion suggestions for similar
+                prompts. Lossy (a similar prompt may get another feature's answer) and
+                costs an embeddings call per suggestion; needs OPENAI_API_KEY
         """
         self.use_claude = use_claude
+        self.use_cache = cache
 
         if use_claude and settings.anthropic_api_key:
-            self.client = Anthropic(api_key=settings.anthropic_api_key)
+            self.client = _anthropic_client(settings.anthropic_api_key)
             self.model = settings.claude_model
         elif settings.openai_api_key:
-            self.client = OpenAI(api_key=settings.openai_api_key)
+            self.client = _openai_client(settings.openai_api_key)
             self.model = settings.ai_model
             self.use_claude = False
         else:
             raise ValueError("No AI API key configured. Set ANTHROPIC_API_KEY or OPENAI_API_KEY")
 
+        self.semantic_cache: Optional[SemanticCache] = None
+        if cache and use_semantic_cache and settings.openai_api_key:
+            embedder = (
+                _openai_client(settings.openai_api_key) if self.use_claude else self.client
+            )
+            self.semantic_cache = SemanticCache(
+                partial(self._embed, embedder),
+                threshold=settings.semantic_cache_threshold,
+                max_age=_RESPONSE_CACHE_MAX_AGE,
+            )
+
     def generate_test_from_flow(
         self,
         page: str,
         user_flow: str,
         requirements: Optional[List[str]] = None,
         test_name: Optional[str] = None,
+        stream_callback: Optional[Callable[[str], None]] = None,
     ) -> str:
         """
         Generate a test case from a user flow description
@@ -66,12 +359,19 @@ class AITestGenerator:
             user_flow: Description of the user flow
             requirements: Optional list of specific requirements
             test_name: Optional custom test name
+            stream_callback: Optional function called with each response chunk as it
+                arrives (e.g. to show progress)
 
         Returns:
             Generated Python test code
         """
         prompt = self._build_test_generation_prompt(page, user_flow, requirements)
-        generated_code = self._call_ai(prompt)
+        generated_code = self._call_ai(
+            prompt,
+            max_tokens=_MAX_TOKENS["test"],
+            cached_prefix=_TEST_GENERATION_INSTRUCTIONS,
+            stream_callback=stream_callback,
+        )
         return self._clean_generated_code(generated_code, test_name)
 
     def generate_tests_from_sitemap(
@@ -89,19 +389,31 @@ class AITestGenerator:
         """
         if pages is None:
             pages = [page.value for page in ToyotaPages]
+        if critical_only:
+            pages = [page for page in pages if self._is_critical_page(page)]
 
-        tests = {}
-        for page in pages:
-            if critical_only and not self._is_critical_page(page):
-                continue
-
-            test_code = self.generate_test_from_flow(
+        def generate(page: str) -> str:
+            return self.generate_test_from_flow(
                 page=page, user_flow=f"Standard navigation and interaction with {page}", requirements=[]
             )
-            test_file_name = f"test_{page.replace('/', '_').strip('_')}.py"
-            tests[test_file_name] = test_code
 
-        return tests
+        # One request per output file: repeated pages (or pages sharing a file name,
+        # where the last one wins) would only overwrite each other's result
+        page_by_file = {_PAGE_TEST_FILES.get(page) or _test_file_name(page): page for page in pages}
+        unique_pages = list(page_by_file.values())
+        return dict(zip(page_by_file, self._run_concurrently(generate, unique_pages)))
+
+    def _run_concurrently(self, func: Callable[[Any], Any], items: List[Any]) -> List[Any]:
+        """
+        Apply func (which calls the AI API) to each item, overlapping the requests
+
+        API calls are network bound, so threads overlap the wait; results keep the
+        order of items.
+        """
+        if len(items) <= 1:
+            return [func(item) for item in items]
+        with ThreadPoolExecutor(max_workers=min(_MAX_CONCURRENT_CALLS, len(items))) as executor:
+            return list(executor.map(func, items))
 
     def enhance_existing_test(self, test_file_path: Path, enhancement_type: str) -> str:
         """
@@ -114,8 +426,7 @@ class AITestGenerator:
         Returns:
             Enhanced test code
         """
-        with open(test_file_path, "r") as f:
-            existing_code = f.read()
+        existing_code = Path(test_file_path).read_text(encoding="utf-8")
 
         prompt = f"""
         Enhance the following Playwright test with {enhancement_type} checks:
@@ -128,7 +439,7 @@ class AITestGenerator:
         Return only the enhanced Python code.
         """
 
-        enhanced_code = self._call_ai(prompt)
+        enhanced_code = self._call_ai(prompt, max_tokens=_MAX_TOKENS["test"])
         return self._clean_generated_code(enhanced_code)
 
     def suggest_test_scenarios(self, feature: str, context: Optional[str] = None) -> List[Dict[str, Any]]:
@@ -143,95 +454,251 @@ class AITestGenerator:
             List of suggested test scenarios with metadata
         """
         prompt = f"""
-        Suggest comprehensive test scenarios for the following feature on toyota.com:
-
         Feature: {feature}
         {f"Context: {context}" if context else ""}
-
-        Provide test scenarios covering:
-        1. Happy path
-        2. Edge cases
-        3. Error handling
-        4. Accessibility
-        5. Performance
-        6. Mobile responsiveness
-
-        Return as JSON array with this structure:
-        [
-            {{
-                "name": "Test scenario name",
-                "description": "What this test validates",
-                "priority": "critical|high|medium|low",
-                "type": "smoke|regression|visual|performance",
-                "steps": ["Step 1", "Step 2", ...]
-            }}
-        ]
         """
 
-        response = self._call_ai(prompt)
+        response = self._call_ai_semantic(
+            prompt, _TEST_SCENARIOS_INSTRUCTIONS, max_tokens=_MAX_TOKENS["scenarios"]
+        )
         scenarios = self._extract_json(response)
         return scenarios if isinstance(scenarios, list) else []
 
     def _build_test_generation_prompt(
         self, page: str, user_flow: str, requirements: Optional[List[str]]
     ) -> str:
-        """Build the prompt for test generation"""
+        """Build the per-test part of the generation prompt (sent after the static instructions)"""
         requirements_text = "\n".join(f"- {req}" for req in (requirements or []))
 
         return f"""
-        Generate a comprehensive Playwright Python test for toyota.com:
-
         Page/Feature: {page}
         User Flow: {user_flow}
         Requirements:
         {requirements_text if requirements_text else "- Standard functionality validation"}
+        """
 
-        Generate a pytest test that:
-        1. Uses page object pattern for selectors
-        2. Includes proper assertions
-        3. Handles waits and timeouts appropriately
-        4. Includes accessibility checks
-        5. Has clear test documentation
-        6. Uses fixtures for setup/teardown
-        7. Includes visual regression checkpoints if appropriate
-        8. Validates performance metrics
+    @cached_llm(max_age=_RESPONSE_CACHE_MAX_AGE, model_attr="model")
+    def _call_ai(
+        self,
+        prompt: str,
+        max_tokens: int = 4096,
+        cached_prefix: Optional[str] = None,
+        stream_callback: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        Call the AI API
 
-        Return ONLY valid Python code with no explanations.
-        Use this structure:
+        Responses are cached by model, prompt, prefix and max_tokens (see llm_cache).
 
-        ```python
-        import pytest
-        from playwright.sync_api import Page, expect
-        from src.core.page_objects.base_page import BasePage
-
-        @pytest.mark.smoke
-        def test_feature_name(page: Page):
-            '''Test description'''
-            # Test implementation
-            pass
-        ```
+        Args:
+            prompt: Prompt text
+            max_tokens: Max tokens in the response
+            cached_prefix: Optional static text sent before the prompt. With Claude it is
+                marked for prompt caching once it reaches the minimum cacheable length.
+            stream_callback: Optional function called with each response chunk as it
+                arrives; the response is then streamed (not called on cache hits)
+
+        Raises:
+            ValueError: If the prompt and max_tokens cannot fit the model's context window
         """
+        self._check_context_window(prompt, max_tokens, cached_prefix)
+
+        if stream_callback is not None:
+            chunks = []
+            for chunk in self.stream_call(prompt, max_tokens, cached_prefix):
+                stream_callback(chunk)
+                chunks.append(chunk)
+            return "".join(chunks)
 
-    def _call_ai(self, prompt: str, max_tokens: int = 4096) -> str:
-        """Call the AI API"""
         if self.use_claude:
             response = self.client.messages.create(
                 model=self.model,
                 max_tokens=max_tokens,
-                messages=[{"role": "user", "content": prompt}],
+                messages=[{"role": "user", "content": self._build_content(prompt, cached_prefix)}],
             )
             return response.content[0].text
         else:
+            if cached_prefix:
+                prompt = cached_prefix + prompt
             response = self.client.chat.completions.create(
                 model=self.model, messages=[{"role": "user", "content": prompt}], max_tokens=max_tokens
             )
             return response.choices[0].message.content
 
+    def _call_ai_semantic(self, prompt: str, cached_prefix: str, max_tokens: int = 4096) -> str:
+        """
+        Call the AI API, reusing the response to a similar earlier prompt
+
+        Only for suggestion prompts, where a near-duplicate answer is acceptable;
+        code generation stays on the exact-match cache.
+
+        Args:
+            prompt: Per-call part of the prompt (the part compared for similarity)
+            cached_prefix: Static instructions; prompts only match within the same ones
+            max_tokens: Max tokens in the response
+        """
+        if self.semantic_cache is None:
+            return self._call_ai(prompt, max_tokens, cached_prefix=cached_prefix)
+
+        namespace = make_key(self.model, cached_prefix)
+        try:
+            response, vector = self.semantic_cache.lookup(namespace, prompt)
+        except Exception as e:
+            print(f"Semantic cache lookup failed: {e}")
+            return self._call_ai(prompt, max_tokens, cached_prefix=cached_prefix)
+
+        if response is None:
+            response = self._call_ai(prompt, max_tokens, cached_prefix=cached_prefix)
+            if response:
+                self.semantic_cache.store(namespace, vector, response)
+        return response
+
+    @staticmethod
+    def _embed(client: "OpenAI", text: str) -> List[float]:
+        """Embed text with the configured OpenAI embedding model"""
+        response = client.embeddings.create(model=settings.embedding_model, input=text)
+        return response.data[0].embedding
+
+    def stream_call(
+        self, prompt: str, max_tokens: int = 4096, cached_prefix: Optional[str] = None
+    ) -> Iterator[str]:
+        """
+        Call the AI API and yield the response text as it is generated
+
+        Args:
+            prompt: Prompt text
+            max_tokens: Max tokens in the response
+            cached_prefix: Optional static text sent before the prompt (see _call_ai)
+
+        Yields:
+            Response text chunks
+        """
+        self._check_context_window(prompt, max_tokens, cached_prefix)
+
+        if self.use_claude:
+            with self.client.messages.stream(
+                model=self.model,
+                max_tokens=max_tokens,
+                messages=[{"role": "user", "content": self._build_content(prompt, cached_prefix)}],
+            ) as stream:
+                yield from stream.text_stream
+        else:
+            if cached_prefix:
+                prompt = cached_prefix + prompt
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                stream=True,
+            )
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+
+    def _check_context_window(
+        self, prompt: str, max_tokens: int, cached_prefix: Optional[str] = None
+    ):
+        """Fail before the API call if the request cannot fit the context window"""
+        # Rough estimate (~4 characters per token), as in scripts/_prompt_tokens.py
+        prompt_tokens = (len(prompt) + len(cached_prefix or "") + 3) // 4
+        window = _CONTEXT_WINDOW_TOKENS["claude" if self.use_claude else "openai"]
+        if prompt_tokens + max_tokens > window:
+            raise ValueError(
+                f"Prompt is ~{prompt_tokens} tokens; with max_tokens={max_tokens} it exceeds "
+                f"the {window} token context window"
+            )
+
+    @staticmethod
+    def _build_content(prompt: str, cached_prefix: Optional[str] = None) -> Any:
+        """Build Claude message content, marking cached_prefix as cacheable if long enough"""
+        if not cached_prefix:
+            return prompt
+        # Rough estimate (~4 characters per token), as in _check_context_window
+        if (len(cached_prefix) + 3) // 4 < _MIN_CACHEABLE_PREFIX_TOKENS:
+            return cached_prefix + prompt
+        return [
+            {"type": "text", "text": cached_prefix, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": prompt},
+        ]
+
+    def submit_batch(
+        self, prompts: List[str], max_tokens: int = 4096, cached_prefix: Optional[str] = None
+    ) -> str:
+        """
+        Submit prompts through the Anthropic Message Batches API
+
+        Batched requests are billed at a discount but may take up to 24h to process.
+
+        Args:
+            prompts: Prompts to submit; results keep the same order
+            max_tokens: Max tokens per response
+            cached_prefix: Optional static text shared by all prompts (see _call_ai)
+
+        Returns:
+            Batch ID to pass to get_batch_results
+        """
+        if not self.use_claude:
+            raise ValueError("Batch submission requires Claude (ANTHROPIC_API_KEY)")
+
+        batch = self.client.messages.batches.create(
+            requests=[
+                {
+                    "custom_id": f"prompt-{i}",
+                    "params": {
+                        "model": self.model,
+                        "max_tokens": max_tokens,
+                        "messages": [
+                            {"role": "user", "content": self._build_content(prompt, cached_prefix)}
+                        ],
+                    },
+                }
+                for i, prompt in enumerate(prompts)
+            ]
+        )
+        return batch.id
+
+    def get_batch_results(
+        self, batch_id: str, poll_interval: float = 10.0, timeout: float = 3600.0
+    ) -> List[Optional[str]]:
+        """
+        Wait for a batch to finish and return its responses
+
+        Args:
+            batch_id: ID returned by submit_batch
+            poll_interval: Seconds between status checks
+            timeout: Seconds to wait for the batch before giving up
+
+        Returns:
+            Response text per submitted prompt, in order (None for failed requests)
+
+        Raises:
+            TimeoutError: If the batch has not ended within timeout
+        """
+        deadline = time.monotonic() + timeout
+        batch = self.client.messages.batches.retrieve(batch_id)
+        while batch.processing_status != "ended":
+            if time.monotonic() >= deadline:
+                raise TimeoutError(
+                    f"Batch {batch_id} still {batch.processing_status} after {timeout:.0f}s; "
+                    "fetch it later with get_batch_results"
+                )
+            time.sleep(poll_interval)
+            batch = self.client.messages.batches.retrieve(batch_id)
+
+        responses: Dict[int, str] = {}
+        for entry in self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                index = int(entry.custom_id.rsplit("-", 1)[1])
+                responses[index] = entry.result.message.content[0].text
+
+        total = batch.request_counts.succeeded + batch.request_counts.errored
+        total += batch.request_counts.canceled + batch.request_counts.expired
+        return [responses.get(i) for i in range(total)]
+
     def _clean_generated_code(self, code: str, custom_name: Optional[str] = None) -> str:
         """Clean and format generated code"""
         # Remove markdown code blocks
-        code = re.sub(r"```python\n", "", code)
-        code = re.sub(r"```\n?", "", code)
+        code = _CODE_FENCE_RE.sub("", code)
 
         # Ensure proper imports
         if "import pytest" not in code:
@@ -239,37 +706,27 @@ class AITestGenerator:
 
         # Custom test name if provided
         if custom_name:
-            code = re.sub(r"def test_\w+", f"def {custom_name}", code, count=1)
+            code = _TEST_DEF_RE.sub(f"def {custom_name}", code, count=1)
 
         return code.strip()
 
     def _extract_json(self, text: str) -> Any:
         """Extract JSON from AI response"""
         # Try to find JSON in markdown blocks
-        json_match = re.search(r"```json\n(.*?)\n```", text, re.DOTALL)
+        json_match = _JSON_FENCE_RE.search(text)
         if json_match:
-            return json.loads(json_match.group(1))
+            return orjson.loads(json_match.group(1))
 
         # Try to find raw JSON
         try:
-            return json.loads(text)
-        except json.JSONDecodeError:
-            # Try to find JSON array or object
-            json_match = re.search(r"(\[.*\]|\{.*\})", text, re.DOTALL)
-            if json_match:
-                return json.loads(json_match.group(1))
-
-        return None
+            return orjson.loads(text)
+        except orjson.JSONDecodeError:
+            # The first top-level array/object that parses
+            return parse_embedded_json(text)
 
     def _is_critical_page(self, page: str) -> bool:
         """Determine if a page is critical"""
-        critical_pages = [
-            ToyotaPages.HOMEPAGE.value,
-            ToyotaPages.VEHICLES.value,
-            ToyotaPages.BUILD_AND_PRICE.value,
-            ToyotaPages.DEALERS.value,
-        ]
-        return page in critical_pages
+        return page in _CRITICAL_PAGES
 
     def save_generated_test(self, test_code: str, filename: str, output_dir: Optional[Path] = None):
         """
@@ -286,8 +743,7 @@ class AITestGenerator:
         output_dir.mkdir(parents=True, exist_ok=True)
         output_path = output_dir / filename
 
-        with open(output_path, "w") as f:
-            f.write(test_code)
+        output_path.write_text(test_code, encoding="utf-8")
 
         print(f"Generated test saved to: {output_path}")
 
@@ -322,37 +778,24 @@ class AITestGenerator:
         if not MCP_AVAILABLE:
             raise ImportError("MCP modules not available. Install MCP dependencies.")
 
-        with open(recorded_test_path, 'r') as f:
-            recorded_code = f.read()
+        recorded_code = Path(recorded_test_path).read_text(encoding="utf-8")
 
+        # The requirements for a level are fixed text, so they are part of the cached prefix
+        instructions = _MCP_ENHANCE_PREFIXES.get(
+            enhancement_level, _MCP_ENHANCE_PREFIXES["moderate"]
+        )
         prompt = f"""
-        Enhance the following Playwright test that was recorded via MCP codegen:
-
         Flow Description: {flow_description}
 
         Recorded Test:
         ```python
         {recorded_code}
         ```
-
-        Enhancement Level: {enhancement_level}
-
-        Please enhance this test with:
-        {self._get_enhancement_requirements(enhancement_level)}
-
-        IMPORTANT:
-        - Preserve all the original actions and selectors
-        - Add assertions after key actions to validate state
-        - Use expect() assertions from playwright.sync_api
-        - Add comments explaining what each assertion validates
-        - Integrate self-healing selectors from src.ai.self_healing
-        - Add visual regression checks if appropriate
-        - Include performance checks for page load and interactions
-
-        Return ONLY the enhanced Python code with proper pytest format.
         """
 
-        enhanced_code = self._call_ai(prompt, max_tokens=6000)
+        enhanced_code = self._call_ai(
+            prompt, max_tokens=_MAX_TOKENS["enhance"], cached_prefix=instructions
+        )
         return self._clean_generated_code(enhanced_code)
 
     def generate_from_mcp_actions(
@@ -376,44 +819,16 @@ class AITestGenerator:
         actions_text = self._format_actions_for_prompt(actions)
 
         prompt = f"""
-        Generate a comprehensive Playwright pytest test from these recorded actions:
-
         Test Name: {test_name}
         Flow Description: {flow_description}
 
         Recorded Actions:
         {actions_text}
-
-        Generate a complete pytest test that:
-        1. Implements all the recorded actions
-        2. Adds meaningful assertions after each major action
-        3. Uses self-healing selectors from src.ai.self_healing
-        4. Includes error handling
-        5. Adds visual regression checks at key points
-        6. Validates page state and transitions
-        7. Includes accessibility checks
-        8. Uses proper pytest fixtures and markers
-
-        Structure:
-        ```python
-        import pytest
-        from playwright.sync_api import Page, expect
-        from src.ai.self_healing import SelfHealingSelector
-        from src.ai.visual_ai import VisualAI
-
-        @pytest.mark.mcp_generated
-        @pytest.mark.smoke  # or appropriate marker
-        def {test_name}(page: Page):
-            '''
-            {flow_description}
-            '''
-            # Test implementation with all actions and assertions
-        ```
-
-        Return ONLY valid Python code.
         """
 
-        generated_code = self._call_ai(prompt, max_tokens=6000)
+        generated_code = self._call_ai(
+            prompt, max_tokens=_MAX_TOKENS["enhance"], cached_prefix=_MCP_ACTIONS_INSTRUCTIONS
+        )
         return self._clean_generated_code(generated_code, test_name)
 
     def suggest_assertions_for_recording(
@@ -434,32 +849,15 @@ class AITestGenerator:
         actions_text = self._format_actions_for_prompt(recorded_actions)
 
         prompt = f"""
-        For the following recorded user actions on {page_url}, suggest meaningful assertions
-        to validate the application state:
+        Page URL: {page_url}
 
         Recorded Actions:
         {actions_text}
-
-        Suggest assertions that:
-        1. Verify page transitions completed successfully
-        2. Check that elements are visible/clickable after interactions
-        3. Validate form submissions
-        4. Check URL changes
-        5. Verify content updates
-
-        Return as JSON array:
-        [
-            {{
-                "after_action": "Action number (0-based index)",
-                "assertion_type": "expect_visible|expect_url|expect_text|expect_count",
-                "selector": "CSS selector to check",
-                "description": "What this assertion validates",
-                "code": "expect(page.locator('...')).to_be_visible()"
-            }}
-        ]
         """
 
-        response = self._call_ai(prompt)
+        response = self._call_ai_semantic(
+            prompt, _ASSERTION_SUGGESTION_INSTRUCTIONS, max_tokens=_MAX_TOKENS["assertions"]
+        )
         assertions = self._extract_json(response)
         return assertions if isinstance(assertions, list) else []
 
@@ -478,8 +876,7 @@ class AITestGenerator:
         Returns:
             Refactored test code using page objects
         """
-        with open(recorded_test_path, 'r') as f:
-            recorded_code = f.read()
+        recorded_code = Path(recorded_test_path).read_text(encoding="utf-8")
 
         prompt = f"""
         Refactor this Playwright test to use the page object pattern:
@@ -512,63 +909,34 @@ class AITestGenerator:
         Return ONLY the refactored Python code.
         """
 
-        refactored_code = self._call_ai(prompt, max_tokens=6000)
+        refactored_code = self._call_ai(prompt, max_tokens=_MAX_TOKENS["enhance"])
         return self._clean_generated_code(refactored_code)
 
     def _get_enhancement_requirements(self, level: str) -> str:
         """Get enhancement requirements based on level"""
-        requirements = {
-            "minimal": """
-                - Add basic expect() assertions after navigation and clicks
-                - Validate page loaded successfully
-                - Use self-healing selectors
-            """,
-            "moderate": """
-                - Add comprehensive expect() assertions after all interactions
-                - Validate page state and element visibility
-                - Use self-healing selectors with fallbacks
-                - Add basic visual regression checks at key points
-                - Include accessibility checks for interactive elements
-            """,
-            "full": """
-                - Add comprehensive expect() assertions for all actions
-                - Validate page state, URL, content, and element states
-                - Use self-healing selectors with multiple fallback strategies
-                - Add visual regression checks at all major UI states
-                - Include comprehensive accessibility checks
-                - Add performance validations for page load and interactions
-                - Include anomaly detection for console errors
-                - Add data-driven test variations if applicable
-            """
-        }
-        return requirements.get(level, requirements["moderate"])
+        return _ENHANCEMENT_REQUIREMENTS.get(level, _ENHANCEMENT_REQUIREMENTS["moderate"])
 
     def _format_actions_for_prompt(self, actions: List[Dict[str, Any]]) -> str:
         """Format actions list for AI prompt"""
         formatted = []
         for i, action in enumerate(actions):
             action_type = action.get('type', 'unknown')
-            selector = action.get('selector', '')
-            value = action.get('value', '')
-            url = action.get('url', '')
-
-            if action_type == 'navigate':
-                formatted.append(f"{i}. Navigate to: {url}")
-            elif action_type == 'click':
-                formatted.append(f"{i}. Click: {selector}")
-            elif action_type == 'fill':
-                formatted.append(f"{i}. Fill '{selector}' with: {value}")
-            elif action_type == 'select':
-                formatted.append(f"{i}. Select '{value}' in: {selector}")
-            else:
-                formatted.append(f"{i}. {action_type}: {selector}")
-
+            formatted.append(
+                _ACTION_FORMATS.get(action_type, _ACTION_FORMAT_DEFAULT).format(
+                    i=i,
+                    type=action_type,
+                    selector=action.get('selector', ''),
+                    value=action.get('value', ''),
+                    url=action.get('url', ''),
+                )
+            )
         return "\n".join(formatted)
 
     def create_test_suite_from_mcp_sessions(
         self,
         sessions: List[Dict[str, Any]],
-        suite_name: str
+        suite_name: str,
+        sessions_per_call: int = 1
     ) -> Dict[str, str]:
         """
         Create a complete test suite from multiple MCP recording sessions.
@@ -576,26 +944,77 @@ class AITestGenerator:
         Args:
             sessions: List of MCP session data
             suite_name: Name for the test suite
+            sessions_per_call: Sessions packed into one AI request. Packing shares the
+                instructions across sessions but all their tests must fit one response
+                (_MAX_TOKENS["suite"]), so it suits short recordings.
 
         Returns:
             Dictionary mapping test names to generated code
         """
-        test_suite = {}
+        test_names = [
+            session.get('test_name', f"test_{i}") for i, session in enumerate(sessions, 1)
+        ]
 
-        for session in sessions:
-            test_name = session.get('test_name', f"test_{len(test_suite) + 1}")
-            flow_description = session.get('description', 'Generated from MCP recording')
-            actions = session.get('actions', [])
+        def generate(i: int) -> str:
+            return self.generate_from_mcp_actions(
+                actions=sessions[i].get('actions', []),
+                test_name=test_names[i],
+                flow_description=sessions[i].get('description', 'Generated from MCP recording')
+            )
 
-            test_code = self.generate_from_mcp_actions(
-                actions=actions,
-                test_name=test_name,
-                flow_description=flow_description
+        def generate_group(group: List[int]) -> List[str]:
+            if len(group) == 1:
+                return [generate(group[0])]
+            packed = self._generate_packed_sessions(
+                [(test_names[i], sessions[i]) for i in group]
             )
+            # Sessions missing from the packed response are generated on their own
+            return [packed.get(test_names[i]) or generate(i) for i in group]
+
+        indices = list(range(len(sessions)))
+        step = max(1, sessions_per_call)
+        groups = [indices[start:start + step] for start in range(0, len(indices), step)]
+        test_codes = [
+            code for group_codes in self._run_concurrently(generate_group, groups)
+            for code in group_codes
+        ]
+        return {f"{name}.py": test_code for name, test_code in zip(test_names, test_codes)}
+
+    def _generate_packed_sessions(
+        self, named_sessions: List[Tuple[str, Dict[str, Any]]]
+    ) -> Dict[str, str]:
+        """
+        Generate tests for several sessions with one AI request
 
-            test_suite[f"{test_name}.py"] = test_code
+        Args:
+            named_sessions: (test name, session data) pairs
 
-        return test_suite
+        Returns:
+            Cleaned code per test name; empty if the response is not a JSON object
+        """
+        sessions_text = "\n\n".join(
+            f"Session {n}\n"
+            f"Test Name: {name}\n"
+            f"Flow Description: {session.get('description', 'Generated from MCP recording')}\n"
+            f"Recorded Actions:\n{self._format_actions_for_prompt(session.get('actions', []))}"
+            for n, (name, session) in enumerate(named_sessions, 1)
+        )
+
+        response = self._call_ai(
+            sessions_text, max_tokens=_MAX_TOKENS["suite"], cached_prefix=_MCP_SUITE_INSTRUCTIONS
+        )
+        try:
+            tests = self._extract_json(response)
+        except ValueError:
+            tests = None
+        if not isinstance(tests, dict):
+            return {}
+
+        return {
+            name: self._clean_generated_code(code, name)
+            for name, code in tests.items()
+            if isinstance(code, str) and code.strip()
+        }
 
 
 def main():
@@ -610,10 +1029,29 @@ def main():
     parser.add_argument("--critical-only", action="store_true", help="Only critical pages")
     parser.add_argument("--output", help="Output directory", default="tests/ai_generated")
     parser.add_argument("--use-gpt", action="store_true", help="Use GPT instead of Claude")
+    parser.add_argument("--no-cache", action="store_true", help="Always call the AI API")
+    parser.add_argument("--clear-cache", action="store_true", help="Drop cached AI responses")
+    parser.add_argument(
+        "--semantic-cache",
+        action="store_true",
+        help="Reuse scenario suggestions for similar features (needs OPENAI_API_KEY)",
+    )
 
     args = parser.parse_args()
 
-    generator = AITestGenerator(use_claude=not args.use_gpt)
+    generator = AITestGenerator(
+        use_claude=not args.use_gpt,
+        cache=not args.no_cache,
+        use_semantic_cache=args.semantic_cache,
+    )
+
+    if args.clear_cache:
+        clear_cache()
+        if generator.semantic_cache:
+            generator.semantic_cache.clear()
+        else:
+            clear_semantic_cache()
+        print("Cleared cached AI responses")
 
     if args.sitemap:
         print("Generating tests from sitemap...")
@@ -625,12 +1063,17 @@ def main():
     elif args.feature:
         print(f"Generating test scenarios for: {args.feature}")
         scenarios = generator.suggest_test_scenarios(args.feature)
-        print(json.dumps(scenarios, indent=2))
+        print(orjson.dumps(scenarios, option=orjson.OPT_INDENT_2).decode())
 
     elif args.url and args.flow:
         print(f"Generating test for: {args.url}")
-        test_code = generator.generate_test_from_flow(page=args.url, user_flow=args.flow)
-        filename = f"test_{args.url.replace('/', '_').strip('_')}.py"
+        test_code = generator.generate_test_from_flow(
+            page=args.url,
+            user_flow=args.flow,
+            stream_callback=lambda chunk: print(".", end="", flush=True),
+        )
+        print()
+        filename = _PAGE_TEST_FILES.get(args.url) or _test_file_name(args.url)
         generator.save_generated_test(test_code, filename, Path(args.output))
 
     else:
@@ -6,18 +6,71 @@ like dates, dynamic content, and ads while detecting real visual regressions.
 """
 import base64
 import json
+import re
+from functools import lru_cache
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 
 import cv2
-import imagehash
 import numpy as np
 from anthropic import Anthropic
 from openai import OpenAI
-from PIL import Image
 from playwright.sync_api import Page
 
 from src.config.settings import settings
+from src.core.utils.helpers import parse_embedded_json
+
+# BGR color painted over changed pixels in diff images
+_DIFF_COLOR = np.array((0, 0, 255), dtype=np.uint8)
+
+# Images sent for AI analysis: longest edge (larger images are downscaled by the
+# vision models anyway) and encoding
+_AI_IMAGE_MAX_DIM = 1568
+_AI_IMAGE_MEDIA_TYPE = "image/webp"
+_AI_IMAGE_WEBP_QUALITY = 85
+
+# JSON in a ```json fenced block of an AI response
+_JSON_FENCE_RE = re.compile(r"```json\n(.*?)\n```", re.DOTALL)
+
+
+@lru_cache(maxsize=4)
+def _anthropic_client(api_key: str) -> Anthropic:
+    """Shared Anthropic client per API key, so instances reuse its connection pool"""
+    return Anthropic(api_key=api_key)
+
+
+@lru_cache(maxsize=4)
+def _openai_client(api_key: str) -> OpenAI:
+    """Shared OpenAI client per API key, so instances reuse its connection pool"""
+    return OpenAI(api_key=api_key)
+
+
+def _average_hash(gray: np.ndarray) -> int:
+    """64-bit average hash: each 8x8 block mean above the overall mean sets a bit"""
+    small = cv2.resize(gray, (8, 8), interpolation=cv2.INTER_AREA)
+    return int.from_bytes(np.packbits(small > small.mean()).tobytes(), "big")
+
+
+@lru_cache(maxsize=16)
+def _load_baseline(path: str, mtime_ns: int) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Decode a baseline image with its grayscale and average hash
+
+    Cached per file modification time, so a rewritten baseline is decoded again.
+    The returned arrays are shared between calls and therefore read-only.
+
+    Args:
+        path: Baseline image path
+        mtime_ns: The file's st_mtime_ns (part of the cache key)
+
+    Returns:
+        (BGR image, grayscale image, average hash)
+    """
+    image = cv2.imread(path)
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    image.setflags(write=False)
+    gray.setflags(write=False)
+    return image, gray, _average_hash(gray)
 
 
 class VisualAI:
@@ -32,14 +85,14 @@ class VisualAI:
         """
         self.use_claude = use_claude
         self.baseline_dir = settings.visual_baseline_dir
-        self.baseline_dir.mkdir(parents=True, exist_ok=True)
+        settings.ensure_dirs()
 
         # Initialize AI client (Claude has better vision capabilities)
         if use_claude and settings.anthropic_api_key:
-            self.ai_client = Anthropic(api_key=settings.anthropic_api_key)
+            self.ai_client = _anthropic_client(settings.anthropic_api_key)
             self.ai_model = settings.claude_model
         elif settings.openai_api_key:
-            self.ai_client = OpenAI(api_key=settings.openai_api_key)
+            self.ai_client = _openai_client(settings.openai_api_key)
             self.ai_model = "gpt-4-vision-preview"  # GPT-4 with vision
             self.use_claude = False
         else:
@@ -130,8 +183,10 @@ class VisualAI:
         Returns:
             Dict with comparison results
         """
-        # Load images
-        baseline_img = cv2.imread(str(baseline_path))
+        # Load images (the baseline only changes when rewritten)
+        baseline_img, baseline_gray, baseline_hash = _load_baseline(
+            str(baseline_path), baseline_path.stat().st_mtime_ns
+        )
         current_img = cv2.imread(str(current_path))
 
         # Ensure images are same size
@@ -140,16 +195,36 @@ class VisualAI:
 
         # Apply ignore regions (mask them out)
         if ignore_regions:
+            baseline_img = baseline_img.copy()
             for region in ignore_regions:
                 x, y, w, h = region["x"], region["y"], region["width"], region["height"]
                 baseline_img[y : y + h, x : x + w] = 0
                 current_img[y : y + h, x : x + w] = 0
+            baseline_gray = cv2.cvtColor(baseline_img, cv2.COLOR_BGR2GRAY)
+            baseline_hash = _average_hash(baseline_gray)
+
+        # Identical pixels (one vectorised sum of absolute differences): nothing to score
+        if cv2.norm(baseline_img, current_img, cv2.NORM_L1) == 0:
+            return {
+                "status": "passed",
+                "diff_percentage": 0.0,
+                "ssim_score": 1.0,
+                "hash_similarity": 1.0,
+                "pixel_diff_percent": 0.0,
+                "diff_image": None,
+                "threshold": settings.visual_diff_threshold * 100,
+            }
+
+        # Grayscale once, shared by SSIM and the perceptual hash
+        current_gray = cv2.cvtColor(current_img, cv2.COLOR_BGR2GRAY)
 
         # Structural Similarity Index (SSIM)
-        ssim_score = self._calculate_ssim(baseline_img, current_img)
+        ssim_score = self._calculate_ssim(baseline_gray, current_gray)
 
-        # Perceptual hash comparison
-        hash_similarity = self._calculate_hash_similarity(baseline_path, current_path)
+        # Perceptual hash comparison (on the decoded, masked images)
+        hash_similarity = self._calculate_hash_similarity(
+            baseline_hash, _average_hash(current_gray)
+        )
 
         # Pixel-wise difference
         diff_img, pixel_diff_percent = self._calculate_pixel_difference(baseline_img, current_img)
@@ -171,33 +246,25 @@ class VisualAI:
             "threshold": settings.visual_diff_threshold * 100,
         }
 
-    def _calculate_ssim(self, img1: np.ndarray, img2: np.ndarray) -> float:
-        """Calculate Structural Similarity Index"""
-        # Convert to grayscale
-        gray1 = cv2.cvtColor(img1, cv2.COLOR_BGR2GRAY)
-        gray2 = cv2.cvtColor(img2, cv2.COLOR_BGR2GRAY)
-
+    def _calculate_ssim(self, gray1: np.ndarray, gray2: np.ndarray) -> float:
+        """Calculate Structural Similarity Index of two grayscale images"""
         # Calculate SSIM (simplified version)
         # For production, use skimage.metrics.structural_similarity
-        mean1 = np.mean(gray1)
-        mean2 = np.mean(gray2)
-        std1 = np.std(gray1)
-        std2 = np.std(gray2)
-
-        # Simple correlation coefficient as SSIM approximation
-        correlation = np.corrcoef(gray1.flatten(), gray2.flatten())[0, 1]
-        return max(0.0, correlation)  # Clamp to [0, 1]
-
-    def _calculate_hash_similarity(self, img1_path: Path, img2_path: Path) -> float:
-        """Calculate perceptual hash similarity"""
-        img1 = Image.open(img1_path)
-        img2 = Image.open(img2_path)
-
-        hash1 = imagehash.average_hash(img1)
-        hash2 = imagehash.average_hash(img2)
-
+        mean1, std1 = (float(v[0, 0]) for v in cv2.meanStdDev(gray1))
+        mean2, std2 = (float(v[0, 0]) for v in cv2.meanStdDev(gray2))
+        if std1 == 0 or std2 == 0:
+            return 0.0  # Correlation is undefined for a flat image
+
+        # Simple correlation coefficient as SSIM approximation. The cross term is
+        # summed straight from the uint8 pixels (64-bit accumulator, no float copies)
+        cross = float(np.einsum("ij,ij->", gray1, gray2, dtype=np.int64)) / gray1.size
+        correlation = (cross - mean1 * mean2) / (std1 * std2)
+        return max(0.0, min(1.0, correlation))  # Clamp to [0, 1]
+
+    def _calculate_hash_similarity(self, hash1: int, hash2: int) -> float:
+        """Calculate perceptual hash similarity of two average hashes"""
         # Calculate similarity (0 = identical, higher = more different)
-        hash_diff = hash1 - hash2
+        hash_diff = (hash1 ^ hash2).bit_count()  # Hamming distance
         max_diff = 64  # Maximum possible difference for average hash
 
         similarity = 1 - (hash_diff / max_diff)
@@ -216,11 +283,11 @@ class VisualAI:
         _, thresh = cv2.threshold(gray_diff, 30, 255, cv2.THRESH_BINARY)
 
         # Highlight differences
-        diff_visual[thresh > 0] = [0, 0, 255]  # Red for differences
+        diff_visual[thresh > 0] = _DIFF_COLOR  # Red for differences
 
         # Calculate percentage of different pixels
         total_pixels = img1.shape[0] * img1.shape[1]
-        different_pixels = np.count_nonzero(thresh)
+        different_pixels = cv2.countNonZero(thresh)
         diff_percentage = different_pixels / total_pixels
 
         return diff_visual, diff_percentage
@@ -287,7 +354,7 @@ class VisualAI:
                                     "type": "image",
                                     "source": {
                                         "type": "base64",
-                                        "media_type": "image/png",
+                                        "media_type": _AI_IMAGE_MEDIA_TYPE,
                                         "data": baseline_b64,
                                     },
                                 },
@@ -295,7 +362,7 @@ class VisualAI:
                                     "type": "image",
                                     "source": {
                                         "type": "base64",
-                                        "media_type": "image/png",
+                                        "media_type": _AI_IMAGE_MEDIA_TYPE,
                                         "data": current_b64,
                                     },
                                 },
@@ -316,13 +383,13 @@ class VisualAI:
                                 {
                                     "type": "image_url",
                                     "image_url": {
-                                        "url": f"data:image/png;base64,{baseline_b64}"
+                                        "url": f"data:{_AI_IMAGE_MEDIA_TYPE};base64,{baseline_b64}"
                                     },
                                 },
                                 {
                                     "type": "image_url",
                                     "image_url": {
-                                        "url": f"data:image/png;base64,{current_b64}"
+                                        "url": f"data:{_AI_IMAGE_MEDIA_TYPE};base64,{current_b64}"
                                     },
                                 },
                             ],
@@ -339,31 +406,40 @@ class VisualAI:
         except Exception as e:
             return {"error": f"AI analysis failed: {str(e)}"}
 
-    def _encode_image(self, image_path: Path) -> str:
-        """Encode image as base64"""
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode("utf-8")
+    def _encode_image(self, image_path: Path, max_dim: int = _AI_IMAGE_MAX_DIM) -> str:
+        """
+        Encode image as base64 WebP for AI analysis
 
-    def _extract_json(self, text: str) -> Optional[Dict]:
-        """Extract JSON from AI response"""
-        import re
+        Args:
+            image_path: Image to encode
+            max_dim: Longest edge in pixels; larger images are downscaled
 
-        json_match = re.search(r"```json\n(.*?)\n```", text, re.DOTALL)
-        if json_match:
-            try:
-                return json.loads(json_match.group(1))
-            except json.JSONDecodeError:
-                pass
+        Returns:
+            Base64 image data (media type _AI_IMAGE_MEDIA_TYPE)
+        """
+        image = cv2.imread(str(image_path))
+        scale = max_dim / max(image.shape[:2])
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
 
-        # Try to find raw JSON
-        json_match = re.search(r"(\{.*\})", text, re.DOTALL)
+        ok, buffer = cv2.imencode(
+            ".webp", image, [cv2.IMWRITE_WEBP_QUALITY, _AI_IMAGE_WEBP_QUALITY]
+        )
+        if not ok:
+            raise ValueError(f"Could not encode {image_path} for AI analysis")
+        return base64.b64encode(buffer).decode("utf-8")
+
+    def _extract_json(self, text: str) -> Optional[Dict]:
+        """Extract JSON from AI response"""
+        json_match = _JSON_FENCE_RE.search(text)
         if json_match:
             try:
                 return json.loads(json_match.group(1))
             except json.JSONDecodeError:
                 pass
 
-        return None
+        # Try to find raw JSON: the first top-level {...} that parses
+        return parse_embedded_json(text, "{")
 
     def update_baseline(self, screenshot_name: str):
         """Update baseline screenshot with current version"""
@@ -392,7 +468,8 @@ class VisualAI:
     def _build_html_report(self, results: List[Dict]) -> str:
         """Build HTML report from results"""
         # Simplified HTML report template
-        html = """
+        parts = [
+            """
         <!DOCTYPE html>
         <html>
         <head>
@@ -409,10 +486,12 @@ class VisualAI:
         <body>
             <h1>Visual Regression Test Report</h1>
         """
+        ]
 
         for result in results:
             status_class = result.get("status", "unknown")
-            html += f"""
+            parts.append(
+                f"""
             <div class="result {status_class}">
                 <h3>{result.get('name', 'Unknown Test')}</h3>
                 <p><strong>Status:</strong> {status_class.upper()}</p>
@@ -420,26 +499,28 @@ class VisualAI:
                 {self._format_ai_analysis(result.get('ai_analysis', {}))}
             </div>
             """
+            )
 
-        html += "</body></html>"
-        return html
+        parts.append("</body></html>")
+        return "".join(parts)
 
     def _format_ai_analysis(self, analysis: Dict) -> str:
         """Format AI analysis for HTML report"""
         if not analysis:
             return ""
 
-        html = "<div class='ai-analysis'><h4>AI Analysis</h4>"
-        html += f"<p><strong>Verdict:</strong> {analysis.get('verdict', 'N/A')}</p>"
+        parts = [
+            "<div class='ai-analysis'><h4>AI Analysis</h4>",
+            f"<p><strong>Verdict:</strong> {analysis.get('verdict', 'N/A')}</p>",
+        ]
 
         if "differences_found" in analysis:
-            html += "<p><strong>Differences:</strong></p><ul>"
-            for diff in analysis["differences_found"]:
-                html += f"<li>{diff}</li>"
-            html += "</ul>"
+            parts.append("<p><strong>Differences:</strong></p><ul>")
+            parts.extend(f"<li>{diff}</li>" for diff in analysis["differences_found"])
+            parts.append("</ul>")
 
         if "recommendation" in analysis:
-            html += f"<p><strong>Recommendation:</strong> {analysis['recommendation']}</p>"
+            parts.append(f"<p><strong>Recommendation:</strong> {analysis['recommendation']}</p>")
 
-        html += "</div>"
-        return html
+        parts.append("</div>")
+        return "".join(parts)
@@ -2,6 +2,7 @@
 Constants for toyota.com E2E testing
 """
 from enum import Enum
+from types import MappingProxyType
 
 
 class ToyotaPages(Enum):
@@ -94,33 +95,36 @@ PERFORMANCE_BUDGETS = {
 }
 
 # Critical CSS selectors for toyota.com
-TOYOTA_SELECTORS = {
-    # Homepage
-    "homepage_hero": "[data-testid='hero-carousel']",
-    "homepage_nav": "nav.primary-navigation",
-    "homepage_logo": "a.toyota-logo",
-    # Vehicle browsing
-    "vehicle_grid": "[data-testid='vehicle-grid']",
-    "vehicle_card": ".vehicle-card",
-    "vehicle_filter": "[data-testid='vehicle-filter']",
-    # Build & Price
-    "configurator": "#toyota-configurator",
-    "color_selector": "[data-testid='color-selector']",
-    "trim_selector": "[data-testid='trim-selector']",
-    "package_selector": "[data-testid='package-selector']",
-    # Dealer locator
-    "dealer_search": "[data-testid='dealer-search-input']",
-    "dealer_results": "[data-testid='dealer-results']",
-    "dealer_map": "#dealer-map",
-    # Navigation
-    "main_nav": "nav[role='navigation']",
-    "search_button": "[data-testid='search-button']",
-    "menu_button": "[data-testid='menu-button']",
-}
+TOYOTA_SELECTORS = MappingProxyType(
+    {
+        # Homepage
+        "homepage_hero": "[data-testid='hero-carousel']",
+        "homepage_nav": "nav.primary-navigation",
+        "homepage_logo": "a.toyota-logo",
+        # Vehicle browsing
+        "vehicle_grid": "[data-testid='vehicle-grid']",
+        "vehicle_card": ".vehicle-card",
+        "vehicle_filter": "[data-testid='vehicle-filter']",
+        # Build & Price
+        "configurator": "#toyota-configurator",
+        "color_selector": "[data-testid='color-selector']",
+        "trim_selector": "[data-testid='trim-selector']",
+        "package_selector": "[data-testid='package-selector']",
+        # Dealer locator
+        "dealer_search": "[data-testid='dealer-search-input']",
+        "dealer_results": "[data-testid='dealer-results']",
+        "dealer_map": "#dealer-map",
+        # Navigation
+        "main_nav": "nav[role='navigation']",
+        "search_button": "[data-testid='search-button']",
+        "menu_button": "[data-testid='menu-button']",
+    }
+)
 
 # AI Prompts for test generation
-AI_PROMPTS = {
-    "generate_test": """
+AI_PROMPTS = MappingProxyType(
+    {
+        "generate_test": """
     Generate comprehensive E2E test cases for the following scenario:
 
     Page: {page}
@@ -136,7 +140,7 @@ AI_PROMPTS = {
 
     Format the output as valid Python code with proper assertions and page object pattern.
     """,
-    "analyze_failure": """
+        "analyze_failure": """
     Analyze the following test failure and provide insights:
 
     Test Name: {test_name}
@@ -150,7 +154,7 @@ AI_PROMPTS = {
     3. Whether this is a real bug or test flakiness
     4. Recommendations for test improvement
     """,
-    "suggest_selectors": """
+        "suggest_selectors": """
     The current selector failed: {failed_selector}
 
     Page HTML context:
@@ -164,20 +168,27 @@ AI_PROMPTS = {
 
     Return top 3 alternatives in order of reliability.
     """,
-}
-
-# Test data templates
-TEST_DATA_TEMPLATES = {
-    "user_info": {
-        "first_name": "Test",
-        "last_name": "User",
-        "email": "test.user@example.com",
-        "phone": "555-123-4567",
-        "zip_code": "90210",
-    },
-    "vehicle_preferences": {
-        "body_type": ["SUV", "Sedan", "Truck"],
-        "price_range": ["Under $30K", "$30K-$40K", "$40K-$50K", "Over $50K"],
-        "fuel_type": ["Gasoline", "Hybrid", "Electric"],
-    },
-}
+    }
+)
+
+# Test data templates (read-only; copy before modifying)
+TEST_DATA_TEMPLATES = MappingProxyType(
+    {
+        "user_info": MappingProxyType(
+            {
+                "first_name": "Test",
+                "last_name": "User",
+                "email": "test.user@example.com",
+                "phone": "555-123-4567",
+                "zip_code": "90210",
+            }
+        ),
+        "vehicle_preferences": MappingProxyType(
+            {
+                "body_type": ("SUV", "Sedan", "Truck"),
+                "price_range": ("Under $30K", "$30K-$40K", "$40K-$50K", "Over $50K"),
+                "fuel_type": ("Gasoline", "Hybrid", "Electric"),
+            }
+        ),
+    }
+)
@@ -2,6 +2,7 @@
 Configuration management for AI-Augmented E2E Testing Framework
 """
 import os
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
@@ -9,9 +10,6 @@ from dotenv import load_dotenv
 from pydantic import Field
 from pydantic_settings import BaseSettings
 
-# Load environment variables
-load_dotenv()
-
 # Project root directory
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
@@ -24,6 +22,8 @@ class Settings(BaseSettings):
     anthropic_api_key: Optional[str] = Field(default=None, alias="ANTHROPIC_API_KEY")
     ai_model: str = Field(default="gpt-4-turbo-preview", alias="AI_MODEL")
     claude_model: str = Field(default="claude-3-5-sonnet-20241022", alias="CLAUDE_MODEL")
+    embedding_model: str = Field(default="text-embedding-3-small", alias="EMBEDDING_MODEL")
+    semantic_cache_threshold: float = Field(default=0.92, alias="SEMANTIC_CACHE_THRESHOLD")
 
     # Test Configuration
     base_url: str = Field(default="https://www.toyota.com", alias="BASE_URL")
@@ -67,17 +67,26 @@ class Settings(BaseSettings):
         case_sensitive = False
         populate_by_name = True
 
-    def __init__(self, **kwargs):
-        super().__init__(**kwargs)
-        # Create directories if they don't exist
+    def ensure_dirs(self):
+        """Create the baseline and report directories if they don't exist"""
         self.visual_baseline_dir.mkdir(parents=True, exist_ok=True)
         self.report_dir.mkdir(parents=True, exist_ok=True)
 
 
-# Global settings instance
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Get the global settings instance, loading it (and .env) on first use"""
+    # Load environment variables
+    load_dotenv()
+    return Settings()
 
 
-def get_settings() -> Settings:
-    """Get the global settings instance"""
-    return settings
+class _LazySettings:
+    """Stand-in for the global Settings, loaded on first attribute access"""
+
+    def __getattr__(self, name: str):
+        return getattr(get_settings(), name)
+
+
+# Global settings instance; importing this module (or the name) doesn't load it
+settings: Settings = _LazySettings()  # type: ignore[assignment]
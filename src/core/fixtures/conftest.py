@@ -124,6 +124,8 @@ def anomaly_detector(page: Page, request) -> AnomalyDetector:
                         'page_url': page.url if hasattr(page, 'url') else 'unknown'
                     })
 
+    detector.close()
+
 
 @pytest.fixture(scope="session")
 def error_reporter() -> ErrorReporter:
@@ -175,15 +177,22 @@ def action_recorder(page: Page, mcp_client: MCPClient) -> ActionRecorder:
 
 # Test Lifecycle Hooks
 @pytest.fixture(autouse=True)
-def test_lifecycle(request, page: Page, coverage_analyzer: CoverageAnalyzer):
+def test_lifecycle(request, coverage_analyzer: CoverageAnalyzer):
     """
     Auto-use fixture to track test lifecycle
 
+    Only browser tests (those using the page fixture) are tracked, so unit tests
+    never start a browser.
+
     Args:
         request: Pytest request object
-        page: Playwright page fixture
         coverage_analyzer: Coverage analyzer fixture
     """
+    if "page" not in request.fixturenames:
+        yield
+        return
+    page = request.getfixturevalue("page")
+
     test_name = request.node.name
     test_file = request.node.fspath.basename
 
@@ -212,14 +221,18 @@ def test_lifecycle(request, page: Page, coverage_analyzer: CoverageAnalyzer):
 
 
 @pytest.fixture(autouse=True)
-def performance_monitoring(page: Page, anomaly_detector: AnomalyDetector):
+def performance_monitoring(request):
     """
-    Auto-use fixture to monitor performance
+    Auto-use fixture to monitor performance of browser tests
 
     Args:
-        page: Playwright page fixture
-        anomaly_detector: Anomaly detector fixture
+        request: Pytest request object
     """
+    if "page" not in request.fixturenames:
+        yield
+        return
+    anomaly_detector = request.getfixturevalue("anomaly_detector")
+
     yield
 
     # After test: collect performance metrics
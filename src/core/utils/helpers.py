@@ -4,11 +4,13 @@ Utility Helper Functions
 Common utility functions used across the test framework.
 """
 import json
+import os
 import random
 import string
+import tempfile
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Type
 
 
 def generate_random_string(length: int = 10) -> str:
@@ -71,6 +73,39 @@ def save_json_file(data: Dict[str, Any], file_path: Path):
         json.dump(data, f, indent=2)
 
 
+def write_bytes_atomic(data: bytes, file_path: Path, chunk_size: int = 1 << 20):
+    """
+    Write bytes to a file atomically
+
+    The data is written unbuffered to a temporary file next to the target, which
+    then replaces the target, so readers never see a partially written file. The
+    temporary file is removed if the write fails.
+
+    Args:
+        data: Bytes to write
+        file_path: Output file path
+        chunk_size: Maximum bytes per write call
+    """
+    file_path.parent.mkdir(parents=True, exist_ok=True)
+    # Unique per call, so concurrent writers of the same target never share a temp file
+    fd, tmp_name = tempfile.mkstemp(
+        dir=file_path.parent, prefix=f".{file_path.name}.", suffix=".tmp"
+    )
+    try:
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(fd, view[:chunk_size])
+                view = view[written:]
+        finally:
+            os.close(fd)
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, file_path)
+    except BaseException:
+        os.unlink(tmp_name)
+        raise
+
+
 def wait_for_condition(
     condition_func, timeout: int = 10, interval: float = 0.5
 ) -> bool:
@@ -139,6 +174,52 @@ def parse_currency(currency_string: str) -> float:
     return float(cleaned)
 
 
+def parse_embedded_json(text: str, openers: str = "[{") -> Any:
+    """
+    Parse the first top-level JSON value embedded in text (e.g. an AI response)
+
+    Scans once, tracking bracket depth and double-quoted strings, so brackets nested
+    inside a value are never tried as values of their own. Balanced spans that don't
+    parse (e.g. "[see docs]" in prose) are skipped.
+
+    Args:
+        text: Text that may contain JSON
+        openers: Characters that can start a value ("{" for objects only)
+
+    Returns:
+        Parsed value, or None if no span parses or the outermost one never closes
+        (e.g. truncated output)
+    """
+    begin = -1
+    depth = 0
+    in_string = escaped = False
+    for i, char in enumerate(text):
+        if depth == 0:
+            if char in openers:
+                begin = i
+                depth = 1
+            continue
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "[{":
+            depth += 1
+        elif char in "]}":
+            depth -= 1
+            if depth == 0:
+                try:
+                    return json.loads(text[begin : i + 1])
+                except json.JSONDecodeError:
+                    continue
+    return None
+
+
 def create_directory_if_not_exists(directory: Path):
     """
     Create directory if it doesn't exist
@@ -159,13 +240,24 @@ def get_project_root() -> Path:
     return Path(__file__).parent.parent.parent.parent
 
 
-def retry_on_exception(max_attempts: int = 3, delay: float = 1.0):
+def retry_on_exception(
+    max_attempts: int = 3,
+    delay: float = 1.0,
+    exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+    backoff: float = 1.0,
+    max_delay: Optional[float] = None,
+    jitter: bool = False,
+):
     """
     Decorator to retry function on exception
 
     Args:
         max_attempts: Maximum retry attempts
-        delay: Delay between retries in seconds
+        delay: Delay before the first retry in seconds
+        exceptions: Exception types to retry on (others propagate immediately)
+        backoff: Multiplier applied to the delay after each retry
+        max_delay: Upper bound for the delay in seconds
+        jitter: Sleep a random duration up to the delay instead of the full delay
 
     Returns:
         Decorated function
@@ -177,21 +269,100 @@ def retry_on_exception(max_attempts: int = 3, delay: float = 1.0):
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             attempts = 0
+            wait = delay
             while attempts < max_attempts:
                 try:
                     return func(*args, **kwargs)
-                except Exception as e:
+                except exceptions as e:
                     attempts += 1
                     if attempts >= max_attempts:
                         raise
                     print(f"Attempt {attempts} failed: {e}. Retrying...")
-                    time.sleep(delay)
+                    time.sleep(random.uniform(0, wait) if jitter else wait)
+                    wait *= backoff
+                    if max_delay is not None:
+                        wait = min(wait, max_delay)
 
         return wrapper
 
     return decorator
 
 
+class CircuitOpenError(Exception):
+    """Raised instead of calling a function whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Decorator that stops calling a failing function for a while
+
+    After fail_max consecutive failures the circuit opens and calls raise
+    CircuitOpenError immediately; after reset_timeout seconds a single trial call is
+    let through (other callers still fail fast), closing the circuit again if it
+    succeeds and reopening it if it fails.
+    """
+
+    def __init__(
+        self,
+        fail_max: int = 5,
+        reset_timeout: float = 60.0,
+        exceptions: Tuple[Type[BaseException], ...] = (Exception,),
+    ):
+        """
+        Initialize circuit breaker
+
+        Args:
+            fail_max: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a trial call
+            exceptions: Exception types that count as failures (others propagate
+                without affecting the circuit)
+        """
+        import threading
+
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self.exceptions = exceptions
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def __call__(self, func):
+        import functools
+        import time
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trial = False
+            with self._lock:
+                if self._opened_at is not None:
+                    elapsed = time.monotonic() - self._opened_at
+                    if elapsed < self.reset_timeout or self._trial_running:
+                        raise CircuitOpenError(f"{func.__qualname__} circuit is open")
+                    # Half-open: this caller makes the one trial call
+                    self._trial_running = trial = True
+
+            try:
+                result = func(*args, **kwargs)
+            except self.exceptions:
+                with self._lock:
+                    self._failures += 1
+                    if trial or self._failures >= self.fail_max:
+                        self._opened_at = time.monotonic()
+                raise
+            else:
+                with self._lock:
+                    self._failures = 0
+                    self._opened_at = None
+                return result
+            finally:
+                if trial:
+                    with self._lock:
+                        self._trial_running = False
+
+        return wrapper
+
+
 def take_screenshot_on_failure(page, test_name: str) -> Optional[Path]:
     """
     Take screenshot on test failure
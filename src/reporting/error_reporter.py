@@ -5,12 +5,19 @@ This module tracks known website issues, generates JSON reports, and creates
 JIRA-formatted bug tickets ready for submission.
 """
 
-import json
+import re
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Any
 from collections import defaultdict
 
+import orjson
+
+from src.core.utils.helpers import write_bytes_atomic
+
+# Numeric IDs (cache busters, session IDs) that differ between otherwise identical errors
+_DIGITS_RE = re.compile(r'\d+')
+
 
 class JiraFormatter:
     """Formats error reports for JIRA bug tickets."""
@@ -668,6 +675,35 @@ class ErrorReporter:
         self.report_dir = Path(report_dir)
         self.report_dir.mkdir(parents=True, exist_ok=True)
 
+    @staticmethod
+    def deduplicate_anomalies(anomalies: List) -> List:
+        """
+        Drop repeated anomalies before reporting.
+
+        Anomalies are considered duplicates when they share type, page URL and
+        message once numeric IDs are normalized (e.g. the same tracking pixel
+        failing with different session IDs).
+
+        Args:
+            anomalies: List of Anomaly objects from AnomalyDetector
+
+        Returns:
+            Anomalies with duplicates removed, first occurrence kept
+        """
+        seen = set()
+        unique = []
+        for anomaly in anomalies:
+            key = (
+                getattr(anomaly, 'type', 'unknown'),
+                _DIGITS_RE.sub('0', str(anomaly.message))[:200],
+                getattr(anomaly, 'page_url', 'unknown'),
+            )
+            if key in seen:
+                continue
+            seen.add(key)
+            unique.append(anomaly)
+        return unique
+
     def categorize_errors(self, anomalies: List) -> Dict[str, List[Dict]]:
         """
         Categorize anomalies into known error types.
@@ -680,6 +716,9 @@ class ErrorReporter:
         """
         categorized = defaultdict(list)
 
+        # Fallback for anomalies without a timestamp: one batch timestamp for the run
+        now = datetime.now().isoformat()
+
         for anomaly in anomalies:
             message_lower = str(anomaly.message).lower()
 
@@ -706,7 +745,7 @@ class ErrorReporter:
                 'type': getattr(anomaly, 'type', 'unknown'),
                 'severity': getattr(anomaly, 'severity', 'unknown'),
                 'message': anomaly.message,
-                'timestamp': getattr(anomaly, 'timestamp', datetime.now().isoformat()),
+                'timestamp': getattr(anomaly, 'timestamp', now),
                 'page_url': getattr(anomaly, 'page_url', 'unknown'),
                 'details': getattr(anomaly, 'details', {})
             }
@@ -1052,8 +1091,7 @@ For detailed error information, see:
         # Save JSON report
         json_filename = f"error_report_{timestamp.strftime('%Y%m%d_%H%M%S')}.json"
         json_path = self.report_dir / json_filename
-        with open(json_path, 'w') as f:
-            json.dump(json_report, f, indent=2)
+        write_bytes_atomic(orjson.dumps(json_report, option=orjson.OPT_INDENT_2), json_path)
 
         print(f"\n📊 JSON Report saved: {json_path}")
 
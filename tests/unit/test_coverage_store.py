@@ -0,0 +1,80 @@
+"""
+Unit tests for the SQLite coverage store and its one-time JSON import
+"""
+import orjson
+import pytest
+
+from src.ai.coverage_analyzer import CoverageAnalyzer
+
+
+@pytest.fixture
+def workdir(tmp_path, monkeypatch):
+    """Run in an empty directory; the analyzer keeps its database under test_data/"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _legacy_database():
+    return {
+        "coverage": {
+            "page:/": {
+                "identifier": "/",
+                "type": "page",
+                "tested": True,
+                "test_count": 3,
+                "last_tested": "2024-01-01T00:00:00",
+                "test_files": ["tests/test_homepage.py"],
+            },
+        },
+        "history": [
+            {
+                "test_name": f"test_{i}",
+                "test_file": "tests/test_homepage.py",
+                "timestamp": f"2024-01-01T00:00:0{i}",
+                "pages_visited": ["/"],
+                "features_used": [],
+            }
+            for i in range(3)
+        ],
+        "last_updated": "2024-01-01T00:00:00",
+    }
+
+
+def test_legacy_json_is_imported_once(workdir):
+    legacy_path = workdir / "test_data" / "coverage.json"
+    legacy_path.parent.mkdir()
+    legacy_path.write_bytes(orjson.dumps(_legacy_database()))
+
+    imported = CoverageAnalyzer()
+    assert (workdir / "test_data" / "coverage.sqlite").exists()
+    assert imported.coverage_data["page:/"].test_count == 3
+    assert imported.coverage_data["page:/"].test_files == {"tests/test_homepage.py"}
+    assert [e["test_name"] for e in imported.test_execution_history] == [
+        "test_0",
+        "test_1",
+        "test_2",
+    ]
+
+    # Later JSON edits are ignored once the SQLite database exists
+    legacy_path.write_bytes(orjson.dumps({"coverage": {}, "history": []}))
+    reloaded = CoverageAnalyzer()
+    assert reloaded.coverage_data["page:/"].test_count == 3
+    assert len(reloaded.test_execution_history) == 3
+    assert reloaded.get_coverage_percentage() == imported.get_coverage_percentage()
+
+
+def test_recorded_executions_survive_reload(workdir):
+    analyzer = CoverageAnalyzer()
+    assert analyzer.get_coverage_percentage("page") == 0
+    analyzer.record_test_execution("test_a", "tests/a.py", ["/"], ["vehicle_browsing"])
+    analyzer.record_test_execution("test_b", "tests/b.py", ["/"], [])
+
+    reloaded = CoverageAnalyzer()
+    item = reloaded.coverage_data["page:/"]
+    assert item.tested
+    assert item.test_count == 2
+    assert item.test_files == {"tests/a.py", "tests/b.py"}
+    assert reloaded.coverage_data["flow:vehicle_browsing"].test_count == 1
+    assert [e["test_name"] for e in reloaded.test_execution_history] == ["test_a", "test_b"]
+    assert reloaded.get_coverage_percentage("page") == analyzer.get_coverage_percentage("page")
+    assert reloaded.get_coverage_percentage("page") > 0
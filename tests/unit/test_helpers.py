@@ -0,0 +1,211 @@
+"""
+Unit tests for retry, circuit breaker and atomic write helpers
+"""
+import os
+import threading
+import time
+
+import pytest
+
+from src.core.utils.helpers import (
+    CircuitBreaker,
+    CircuitOpenError,
+    retry_on_exception,
+    write_bytes_atomic,
+)
+
+
+class TransientError(Exception):
+    pass
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record retry sleeps instead of sleeping"""
+    recorded = []
+    monkeypatch.setattr(time, "sleep", recorded.append)
+    return recorded
+
+
+def test_retry_succeeds_after_transient_failures(sleeps):
+    attempts = []
+
+    @retry_on_exception(max_attempts=3, delay=0.5, exceptions=(TransientError,), backoff=2)
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise TransientError()
+        return "ok"
+
+    assert flaky() == "ok"
+    assert sleeps == [0.5, 1.0]
+
+
+def test_retry_backoff_is_capped_by_max_delay(sleeps):
+    @retry_on_exception(
+        max_attempts=4, delay=1, exceptions=(TransientError,), backoff=10, max_delay=3
+    )
+    def always_fails():
+        raise TransientError()
+
+    with pytest.raises(TransientError):
+        always_fails()
+    assert sleeps == [1, 3, 3]
+
+
+def test_retry_does_not_retry_other_exceptions(sleeps):
+    attempts = []
+
+    @retry_on_exception(max_attempts=3, exceptions=(TransientError,))
+    def bad_request():
+        attempts.append(1)
+        raise ValueError()
+
+    with pytest.raises(ValueError):
+        bad_request()
+    assert len(attempts) == 1
+    assert sleeps == []
+
+
+def test_retry_jitter_sleeps_at_most_the_delay(sleeps):
+    @retry_on_exception(max_attempts=3, delay=0.5, exceptions=(TransientError,), jitter=True)
+    def always_fails():
+        raise TransientError()
+
+    with pytest.raises(TransientError):
+        always_fails()
+    assert len(sleeps) == 2
+    assert all(0 <= s <= 0.5 for s in sleeps)
+
+
+def _breaker_function(breaker):
+    """Function behind breaker that raises, sleeps or returns depending on its argument"""
+
+    @breaker
+    def call(kind="ok"):
+        if kind == "transient":
+            raise TransientError()
+        if kind == "other":
+            raise ValueError()
+        if kind == "slow":
+            time.sleep(0.2)
+        return kind
+
+    return call
+
+
+def test_breaker_opens_after_fail_max_counted_failures():
+    call = _breaker_function(CircuitBreaker(fail_max=2, exceptions=(TransientError,)))
+
+    for _ in range(2):
+        with pytest.raises(TransientError):
+            call("transient")
+    with pytest.raises(CircuitOpenError):
+        call()
+
+
+def test_breaker_ignores_exceptions_outside_its_filter():
+    call = _breaker_function(CircuitBreaker(fail_max=2, exceptions=(TransientError,)))
+
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            call("other")
+    assert call() == "ok"
+
+
+def test_breaker_success_resets_the_failure_count():
+    call = _breaker_function(CircuitBreaker(fail_max=2, exceptions=(TransientError,)))
+
+    with pytest.raises(TransientError):
+        call("transient")
+    call()
+    with pytest.raises(TransientError):
+        call("transient")
+    assert call() == "ok"
+
+
+def test_breaker_half_open_lets_one_trial_through():
+    call = _breaker_function(
+        CircuitBreaker(fail_max=1, reset_timeout=0.05, exceptions=(TransientError,))
+    )
+    with pytest.raises(TransientError):
+        call("transient")
+    time.sleep(0.06)
+
+    results = []
+
+    def run(kind):
+        try:
+            results.append(call(kind))
+        except CircuitOpenError:
+            results.append("open")
+
+    trial = threading.Thread(target=run, args=("slow",))
+    trial.start()
+    time.sleep(0.05)
+    others = [threading.Thread(target=run, args=("ok",)) for _ in range(3)]
+    for thread in others:
+        thread.start()
+    for thread in [trial, *others]:
+        thread.join()
+
+    assert sorted(results) == ["open", "open", "open", "slow"]
+    # The successful trial closed the circuit
+    assert call() == "ok"
+
+
+def test_breaker_failed_trial_reopens_the_circuit():
+    call = _breaker_function(
+        CircuitBreaker(fail_max=3, reset_timeout=0.05, exceptions=(TransientError,))
+    )
+    for _ in range(3):
+        with pytest.raises(TransientError):
+            call("transient")
+    time.sleep(0.06)
+
+    with pytest.raises(TransientError):
+        call("transient")
+    with pytest.raises(CircuitOpenError):
+        call()
+
+
+def test_write_bytes_atomic_creates_parents_and_replaces(tmp_path):
+    target = tmp_path / "nested" / "report.json"
+
+    write_bytes_atomic(b"first", target)
+    write_bytes_atomic(b"second" * 1000, target, chunk_size=7)
+
+    assert target.read_bytes() == b"second" * 1000
+    assert os.listdir(target.parent) == ["report.json"]
+
+
+def test_write_bytes_atomic_concurrent_writers_never_mix(tmp_path):
+    target = tmp_path / "report.json"
+    payloads = [bytes([i]) * 100_000 for i in range(8)]
+
+    threads = [
+        threading.Thread(target=write_bytes_atomic, args=(payload, target, 1000))
+        for payload in payloads
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert target.read_bytes() in payloads
+    assert os.listdir(tmp_path) == ["report.json"]
+
+
+def test_write_bytes_atomic_removes_temp_file_on_failure(tmp_path, monkeypatch):
+    target = tmp_path / "report.json"
+    target.write_bytes(b"old")
+
+    def fail_replace(src, dst):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(os, "replace", fail_replace)
+    with pytest.raises(OSError):
+        write_bytes_atomic(b"new", target)
+
+    assert target.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["report.json"]
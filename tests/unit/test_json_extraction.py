@@ -0,0 +1,81 @@
+"""
+Unit tests for extracting JSON from AI responses
+"""
+import time
+
+import pytest
+
+from src.ai.test_generator import AITestGenerator
+from src.ai.visual_ai import VisualAI
+from src.core.utils.helpers import parse_embedded_json
+
+# Model output cut off inside the outer object (e.g. at max_tokens)
+_TRUNCATED = '{"verdict": "fail", "meta": {"confidence": 0.9}, "differences_found": ["header'
+
+
+@pytest.mark.parametrize(
+    "text, openers, expected",
+    [
+        ('{"a": 1}', "[{", {"a": 1}),
+        ('x {"a": {"b": 1}} y', "[{", {"a": {"b": 1}}),
+        ('x {"a": "}{"} y', "[{", {"a": "}{"}),
+        ('{"a": "\\"}"}', "[{", {"a": '"}'}),
+        ('x [1, {"a": [2]}] y', "[{", [1, {"a": [2]}]),
+        ('[see docs] {"a": 1}', "[{", {"a": 1}),
+        ('[1, 2] {"a": 1}', "{", {"a": 1}),
+        ("no json here", "[{", None),
+        ('{"unterminated": ', "[{", None),
+        (_TRUNCATED, "[{", None),
+        ("a stray { brace, then {}", "[{", None),
+    ],
+)
+def test_parse_embedded_json(text, openers, expected):
+    assert parse_embedded_json(text, openers) == expected
+
+
+def test_parse_embedded_json_is_linear_in_unmatched_braces():
+    start = time.perf_counter()
+    assert parse_embedded_json("{" * 200_000) is None
+    assert time.perf_counter() - start < 1
+
+
+@pytest.fixture
+def visual_ai():
+    # _extract_json needs no client or baseline directory
+    return VisualAI.__new__(VisualAI)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('```json\n{"verdict": "PASS"}\n```', {"verdict": "PASS"}),
+        ('Verdict below.\n{"verdict": "FAIL"}', {"verdict": "FAIL"}),
+        ('Ignore {this}. {"verdict": "PASS"}', {"verdict": "PASS"}),
+        ('{"note": "braces } { in strings"}', {"note": "braces } { in strings"}),
+        ("```json\n" + _TRUNCATED, None),
+        ("no json here", None),
+    ],
+)
+def test_visual_ai_extract_json(visual_ai, text, expected):
+    assert visual_ai._extract_json(text) == expected
+
+
+@pytest.fixture
+def test_generator():
+    # _extract_json needs no API client
+    return AITestGenerator.__new__(AITestGenerator)
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ('["login", "search"]', ["login", "search"]),
+        ('```json\n[{"name": "login"}]\n```', [{"name": "login"}]),
+        ('Scenarios:\n[{"name": "login"}]\nDone.', [{"name": "login"}]),
+        ('Note [see docs]. {"name": "login"}', {"name": "login"}),
+        ('[{"name": "login"}, {"name": "sea', None),
+        ("no json here", None),
+    ],
+)
+def test_test_generator_extract_json(test_generator, text, expected):
+    assert test_generator._extract_json(text) == expected
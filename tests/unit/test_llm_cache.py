@@ -0,0 +1,95 @@
+"""
+Unit tests for the LLM response cache (no API calls)
+"""
+import time
+
+import pytest
+
+from src.ai.llm_cache import cached_llm, clear_cache
+
+
+def _make_client(path, max_age=None):
+    """Client class whose _call_ai counts real calls and echoes the prompt"""
+
+    class Client:
+        ai_model = "test-model"
+        use_cache = True
+
+        def __init__(self):
+            self.calls = 0
+
+        @cached_llm(path=path, max_age=max_age)
+        def _call_ai(self, prompt: str, max_tokens: int = 100, cached_prefix=None) -> str:
+            self.calls += 1
+            if prompt == "empty":
+                return ""
+            return f"{cached_prefix or ''}{prompt}:{max_tokens}"
+
+    return Client
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return tmp_path / "ai_cache.sqlite"
+
+
+def test_repeated_prompt_is_served_from_cache(cache_path):
+    client = _make_client(cache_path)()
+
+    assert client._call_ai("hello") == "hello:100"
+    assert client._call_ai("hello") == "hello:100"
+    assert client.calls == 1
+
+
+def test_key_covers_max_tokens_and_prefix(cache_path):
+    client = _make_client(cache_path)()
+
+    client._call_ai("hello")
+    client._call_ai("hello", 200)
+    client._call_ai("hello", cached_prefix="rules|")
+    assert client.calls == 3
+
+
+def test_responses_persist_across_instances_and_classes(cache_path):
+    _make_client(cache_path)()._call_ai("hello")
+
+    # A new class has an empty in-memory layer, so this hit comes from SQLite
+    other = _make_client(cache_path)()
+    assert other._call_ai("hello") == "hello:100"
+    assert other.calls == 0
+
+
+def test_entries_older_than_max_age_are_refreshed(cache_path, monkeypatch):
+    client = _make_client(cache_path, max_age=60)()
+    client._call_ai("hello")
+
+    now = time.time()
+    monkeypatch.setattr(time, "time", lambda: now + 61)
+    client._call_ai("hello")
+    assert client.calls == 2
+
+
+def test_use_cache_false_bypasses_cache(cache_path):
+    client = _make_client(cache_path)()
+    client.use_cache = False
+
+    client._call_ai("hello")
+    client._call_ai("hello")
+    assert client.calls == 2
+
+
+def test_empty_responses_are_not_cached(cache_path):
+    client = _make_client(cache_path)()
+
+    assert client._call_ai("empty") == ""
+    assert client._call_ai("empty") == ""
+    assert client.calls == 2
+
+
+def test_clear_cache_drops_memory_and_disk(cache_path):
+    client = _make_client(cache_path)()
+    client._call_ai("hello")
+
+    clear_cache(cache_path)
+    client._call_ai("hello")
+    assert client.calls == 2